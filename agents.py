@@ -0,0 +1,191 @@
+import os
+
+# agents never open a real window
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import asyncio
+import collections
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from card import Card, Deck
+from faces import FACE_KEYS, WILD_FACE
+from game import UnoGame
+from player import Player, RuleBasedAI, MinimaxAI
+from rules import get_rules
+
+try:
+    from endgame import EndgameTable
+except ImportError:  # numpy is only needed for the precomputed endgame table
+    EndgameTable = None
+
+MAX_DEPTH = 2
+
+
+def encode_game(game: UnoGame) -> tuple:
+    """What a search needs of a game as face ids, small to send to another process"""
+    return ([[card.face for card in player.hand] for player in game.players],
+            [card.face for card in game.discard_pile], game.get_top_card().color,
+            [card.face for card in game.deck.cards], game.current_player, game.direction,
+            game.rules.options(), game.pending_draw)
+
+
+def decode_game(state) -> UnoGame:
+    hands, discard, top_color, deck, current_player, direction, rules, pending_draw = state
+    game = UnoGame.__new__(UnoGame)
+    game.deck = Deck.__new__(Deck)
+    game.deck.cards = [Card(*FACE_KEYS[face]) for face in deck]
+    game.discard_pile = [Card(*FACE_KEYS[face]) for face in discard]
+    top_card = game.discard_pile[-1]
+    top_card.color = top_color  # a wild on top keeps its chosen color
+    game.players = []
+    for seat, faces in enumerate(hands):
+        player = Player(f"Player {seat + 1}", seat)
+        player.hand = [Card(*FACE_KEYS[face]) for face in faces]
+        game.players.append(player)
+    game.current_player = current_player
+    game.direction = direction
+    game.rules = get_rules(**rules)
+    game.pending_draw = pending_draw
+    game.last_wild_color = top_color if top_card.face >= WILD_FACE else None
+    game.listeners = []
+    game.verbose = False
+    return game
+
+
+class AgentService:
+    """
+    Chooses the moves of the bot seats of any number of games.
+
+    Everything that doesn't change during a search is loaded once and shared by all games: the
+    rule-based agent, the playability masks (filled when faces.py is imported) and the endgame
+    table (memory-mapped, so worker processes share its pages too). Card images are already
+    shared by face in assets.py. What a search writes to, the MinimaxAI with its chance node
+    cache and seat, is taken from a free list for each search and put back after, so there are
+    only ever as many as searches running at once. deque.pop and append are atomic, the free
+    list needs no lock.
+
+    Threads keep the event loop free but share the interpreter, so with processes=True the
+    searches run in worker processes instead and scale with the cores. The game is then sent
+    as face ids, copied before the call returns.
+    """
+
+    def __init__(self, workers: int = 4, processes: bool = False, max_depth: int = MAX_DEPTH,
+                 params=None, endgame_path=None):
+        self.max_depth = max_depth
+        self.params = params
+        self.processes = processes
+        # the rule-based agent is only used from the thread that owns the service
+        self.rule = RuleBasedAI(params=params)
+        self._free = collections.deque()
+        self.endgame = None
+        self.executor = None
+        if processes:
+            self.executor = ProcessPoolExecutor(workers, initializer=_start_worker,
+                                                initargs=(max_depth, params, endgame_path))
+        else:
+            if endgame_path and EndgameTable:
+                self.endgame = EndgameTable.load(endgame_path)
+            if workers:
+                self.executor = ThreadPoolExecutor(workers)
+
+    def search(self, game: UnoGame):
+        """Minimax move for the current seat of the game, any number of threads can call this at once"""
+        try:
+            agent = self._free.pop()
+        except IndexError:
+            agent = MinimaxAI(self.max_depth, endgame=self.endgame, verbose=False, params=self.params)
+        try:
+            return agent.choose_move(game.players[game.current_player], game)
+        finally:
+            self._free.append(agent)
+
+    def submit(self, game: UnoGame):
+        """Future of search() on a worker, with processes the game can change as soon as this returns"""
+        if self.processes:
+            return self.executor.submit(_search_state, encode_game(game))
+        return self.executor.submit(self.search, game)
+
+    async def choose_move(self, kind: str, game: UnoGame):
+        """Move of a "rule" or "minimax" bot for the current seat, the searches run on the workers"""
+        if kind == "rule":
+            return self.rule.choose_move(game.players[game.current_player], game)
+        return await asyncio.wrap_future(self.submit(game))
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+
+# the service of a worker process, it searches on the process's own thread
+_worker = None
+
+
+def _start_worker(max_depth: int, params, endgame_path):
+    global _worker
+    _worker = AgentService(0, False, max_depth, params, endgame_path)
+
+
+def _search_state(state):
+    return _worker.search(decode_game(state))
+
+
+def sample_positions(count: int, seed: int = 0, max_turns: int = 200) -> list:
+    """Encoded positions from rule-based games where the seat to move has a choice to make"""
+    import headless
+
+    random.seed(seed)
+    rule = RuleBasedAI()
+    positions = []
+    game = None
+    while len(positions) < count:
+        if game is None:
+            game = UnoGame()
+            game.verbose = False
+        else:
+            game.reset()
+        for _ in range(max_turns):
+            if game.check_winner() is not None or len(positions) >= count:
+                break
+            player = game.players[game.current_player]
+            if len(game.legal_moves(player)) > 1 and random.random() < 0.25:
+                positions.append(encode_game(game))
+            headless.play_turn(game, rule)
+    return positions
+
+
+def bench(positions, workers: int, processes: bool) -> float:
+    """Searches per second over the positions with the given number of workers"""
+    service = AgentService(workers, processes)
+    games = [decode_game(state) for state in positions]
+    try:
+        # start the workers before the clock
+        for future in [service.submit(game) for game in games[:workers]]:
+            future.result()
+        start = time.perf_counter()
+        for future in [service.submit(game) for game in games]:
+            future.result()
+        return len(games) / (time.perf_counter() - start)
+    finally:
+        service.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how minimax searches scale with the agent service workers")
+    parser.add_argument("--positions", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    positions = sample_positions(args.positions, args.seed)
+    counts = sorted({1, 2, 4, 8, args.workers} - {n for n in (2, 4, 8) if n > args.workers})
+    print(f"{len(positions)} positions, searches per second")
+    print(f"{'workers':>8}{'threads':>10}{'processes':>11}")
+    for workers in counts:
+        print(f"{workers:>8}{bench(positions, workers, False):>10.0f}{bench(positions, workers, True):>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
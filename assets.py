@@ -0,0 +1,177 @@
+import os
+import struct
+import threading
+import zlib
+
+import pygame
+from constants import *
+from faces import NUM_FACES, FACE_KEYS
+
+# rendered card faces are cached on disk as one atlas image, bump the version when the look changes
+ATLAS_VERSION = 1
+ATLAS_COLUMNS = 9
+ATLAS_ROWS = (NUM_FACES + ATLAS_COLUMNS - 1) // ATLAS_COLUMNS
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+ATLAS_PATH = os.path.join(CACHE_DIR, f"card_atlas_v{ATLAS_VERSION}_{CARD_WIDTH}x{CARD_HEIGHT}.png")
+
+FILL_COLORS = {"red": RED, "blue": BLUE, "green": GREEN, "yellow": YELLOW}
+
+_fonts = {}
+_faces = [None] * NUM_FACES
+_rotated = {}
+_backs = {}
+_atlas_loaded = False
+
+
+def get_font(size: int, bold: bool = False):
+    # looking up a system font is slow, so each size is only created once
+    font = _fonts.get((size, bold))
+    if font is None:
+        font = pygame.font.SysFont('Arial', size, bold=bold)
+        _fonts[(size, bold)] = font
+    return font
+
+
+def render_card(color: str, value: str):
+    """Draw a card face: colored background, white border and the value with a black outline"""
+    card_img = pygame.Surface((CARD_WIDTH, CARD_HEIGHT))
+
+    # wild cards are black
+    card_img.fill(FILL_COLORS.get(color, BLACK))
+
+    # white border
+    pygame.draw.rect(card_img, WHITE, (3, 3, CARD_WIDTH-6, CARD_HEIGHT-6), 2)
+
+    # print the value of the card on it
+    font = get_font(30, bold=True)
+    shadow = font.render(value, True, BLACK)
+    for dx in [-1, 0, 1]:
+        for dy in [-1, 0, 1]:
+            if dx != 0 or dy != 0:
+                shadow_rect = shadow.get_rect(center=(CARD_WIDTH/2 + dx, CARD_HEIGHT/2 + dy))
+                card_img.blit(shadow, shadow_rect)
+    text = font.render(value, True, WHITE)
+    text_rect = text.get_rect(center=(CARD_WIDTH/2, CARD_HEIGHT/2))
+    card_img.blit(text, text_rect)
+    return card_img.convert()
+
+
+def render_back(font_size: int):
+    """The face-down side of a card: black with the UNO label"""
+    back = pygame.Surface((CARD_WIDTH, CARD_HEIGHT))
+    back.fill(BLACK)
+    pygame.draw.rect(back, WHITE, (3, 3, CARD_WIDTH-6, CARD_HEIGHT-6), 2)
+
+    text = get_font(font_size, bold=True).render("UNO", True, WHITE)
+    text_rect = text.get_rect(center=(CARD_WIDTH/2, CARD_HEIGHT/2))
+    back.blit(text, text_rect)
+    return back.convert()
+
+
+def card_image(face: int):
+    """Image of a card face, rendered the first time it is needed"""
+    image = _faces[face]
+    if image is None:
+        image = render_card(*FACE_KEYS[face])
+        _faces[face] = image
+    return image
+
+
+def rotated_card_image(face: int, rotation: int):
+    # the side players' cards are drawn rotated, keep the rotated copies too
+    image = _rotated.get((face, rotation))
+    if image is None:
+        image = pygame.transform.rotate(card_image(face), rotation)
+        _rotated[(face, rotation)] = image
+    return image
+
+
+def card_back(font_size: int = 20, rotation: int = 0):
+    """Face-down card image, the hands use a smaller label than the deck"""
+    image = _backs.get((font_size, rotation))
+    if image is None:
+        image = render_back(font_size) if rotation == 0 else pygame.transform.rotate(card_back(font_size), rotation)
+        _backs[(font_size, rotation)] = image
+    return image
+
+
+def load_atlas(path: str = ATLAS_PATH) -> bool:
+    """Load every card face from the atlas on disk, returns False if there is none"""
+    global _atlas_loaded
+    if not os.path.exists(path):
+        return False
+    try:
+        atlas = pygame.image.load(path).convert()
+    except pygame.error as e:
+        print(f"Could not load card atlas: {e}")
+        return False
+    if atlas.get_size() != (ATLAS_COLUMNS * CARD_WIDTH, ATLAS_ROWS * CARD_HEIGHT):
+        # not an atlas this version wrote, the cards are rendered instead
+        print(f"Ignoring card atlas {path}: it is {atlas.get_width()}x{atlas.get_height()}")
+        return False
+
+    for face in range(NUM_FACES):
+        x = (face % ATLAS_COLUMNS) * CARD_WIDTH
+        y = (face // ATLAS_COLUMNS) * CARD_HEIGHT
+        _faces[face] = atlas.subsurface((x, y, CARD_WIDTH, CARD_HEIGHT))
+    _atlas_loaded = True
+    return True
+
+
+def save_atlas(path: str = ATLAS_PATH, background: bool = False):
+    """Write every card face into one atlas PNG, the encoding can run on a background thread"""
+    atlas = pygame.Surface((ATLAS_COLUMNS * CARD_WIDTH, ATLAS_ROWS * CARD_HEIGHT))
+    for face in range(NUM_FACES):
+        x = (face % ATLAS_COLUMNS) * CARD_WIDTH
+        y = (face // ATLAS_COLUMNS) * CARD_HEIGHT
+        atlas.blit(card_image(face), (x, y))
+
+    # pygame.image.save keeps the interpreter busy while it encodes, zlib lets the frames go on
+    pixels = pygame.image.tostring(atlas, "RGB")
+    args = (path, atlas.get_width(), atlas.get_height(), pixels)
+    if background:
+        threading.Thread(target=_write_png, args=args, daemon=True).start()
+    else:
+        _write_png(*args)
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def _write_png(path: str, width: int, height: int, pixels: bytes):
+    # 8-bit RGB, every row uses filter type 0
+    stride = width * 3
+    rows = b"".join(b"\0" + pixels[y * stride:(y + 1) * stride] for y in range(height))
+    png = (b"\x89PNG\r\n\x1a\n"
+           + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+           + _png_chunk(b"IDAT", zlib.compress(rows, 6))
+           + _png_chunk(b"IEND", b""))
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # written next to the atlas and renamed over it, so exiting mid-write never leaves half a PNG
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(png)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Could not save card atlas: {e}")
+
+
+def preload_step(count: int = 6) -> bool:
+    """
+    Render up to count card faces that are not ready yet, meant to be called once per frame.
+    Returns True when every face is ready, the atlas is written to disk the first time.
+    """
+    global _atlas_loaded
+    for face in range(NUM_FACES):
+        if count == 0:
+            return False
+        if _faces[face] is None:
+            card_image(face)
+            count -= 1
+
+    if not _atlas_loaded:
+        save_atlas(background=True)
+        _atlas_loaded = True
+    return True
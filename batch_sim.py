@@ -0,0 +1,239 @@
+import os
+
+# headless runs never open a real window
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import time
+
+import numpy as np
+
+from faces import (NUM_FACES, NUM_COLORS, NUM_VALUES, WILD_FACE, ALL_VALUES, ACTION_VALUES,
+                   FACE_COLOR, FACE_VALUE, FACE_COUNTS)
+
+NUM_PLAYERS = 4
+HAND_SIZE = 7
+
+FACE_COLOR_ARR = np.array(FACE_COLOR, dtype=np.int8)
+FACE_VALUE_ARR = np.array(FACE_VALUE, dtype=np.int8)
+FACE_IS_WILD = FACE_COLOR_ARR < 0
+FULL_DECK = np.repeat(np.arange(NUM_FACES, dtype=np.int8), FACE_COUNTS)
+
+SKIP = ALL_VALUES.index("skip")
+REVERSE = ALL_VALUES.index("reverse")
+DRAW2 = ALL_VALUES.index("draw2")
+WILD_DRAW4 = ALL_VALUES.index("wild_draw4")
+
+# RuleBasedAI plays action cards first, then number cards, then wild cards
+IS_ACTION = np.isin(FACE_VALUE_ARR, [ALL_VALUES.index(v) for v in ACTION_VALUES]) & ~FACE_IS_WILD
+IS_NUMBER = ~IS_ACTION & ~FACE_IS_WILD
+CLASS_MASKS = np.stack([IS_ACTION, IS_NUMBER, FACE_IS_WILD]).astype(np.int16)
+
+# turns to advance and cards the next player draws, per played value
+ADVANCE = np.ones(len(ALL_VALUES), dtype=np.int8)
+ADVANCE[[SKIP, DRAW2, WILD_DRAW4]] = 2
+PENALTY = np.zeros(len(ALL_VALUES), dtype=np.int8)
+PENALTY[DRAW2] = 2
+PENALTY[WILD_DRAW4] = 4
+
+
+class BatchUnoGame:
+    """
+    Many independent 4-player games played by RuleBasedAI in lockstep.
+    Follows the UnoGame rules: no reshuffle of the discard pile, a player without
+    a playable card draws one and passes, and reverse flips direction and moves on once.
+    """
+
+    def __init__(self, num_games: int, seed=None, max_turns: int = 1000, deal: bool = True):
+        self.num_games = num_games
+        self.max_turns = max_turns
+        self.rng = np.random.default_rng(seed)
+        # without a deal the games have to be started with set_state
+        if deal:
+            self.reset()
+
+    def reset(self):
+        n = self.num_games
+        rows = np.arange(n)
+
+        # each deck is a shuffled permutation of face ids, drawing takes from the end
+        self.deck = self.rng.permuted(np.tile(FULL_DECK, (n, 1)), axis=1)
+        self.deck_len = np.full(n, len(FULL_DECK), dtype=np.int16)
+
+        # hands are per-face counts, each seat gets 7 cards from the top of the deck
+        self.hands = np.zeros((n, NUM_PLAYERS, NUM_FACES), dtype=np.int16)
+        for seat in range(NUM_PLAYERS):
+            for _ in range(HAND_SIZE):
+                self.deck_len -= 1
+                np.add.at(self.hands, (rows, seat, self.deck[rows, self.deck_len]), 1)
+
+        # the first discard is the top card, a wild goes back and the whole deck is shuffled again
+        # until it isn't, like UnoGame.setup_game
+        size = int(self.deck_len[0])
+        wild = FACE_IS_WILD[self.deck[:, size - 1]]
+        while wild.any():
+            games = rows[wild]
+            self.deck[games, :size] = self.rng.permuted(self.deck[games, :size], axis=1)
+            wild = FACE_IS_WILD[self.deck[:, size - 1]]
+        first_faces = self.deck[:, size - 1]
+        self.deck_len -= 1
+
+        self.top_color = FACE_COLOR_ARR[first_faces].copy()
+        self.top_value = FACE_VALUE_ARR[first_faces].copy()
+        self.current = np.zeros(n, dtype=np.int8)
+        self.direction = np.ones(n, dtype=np.int8)
+        self.turns = np.zeros(n, dtype=np.int32)
+        self.winner = np.full(n, -1, dtype=np.int8)
+        self.active = np.ones(n, dtype=bool)
+
+    def set_state(self, hands, deck, deck_len, top_color, top_value, current=None, direction=None):
+        """Start every game from the given positions instead of a fresh deal"""
+        n = len(hands)
+        self.num_games = n
+        self.hands = np.asarray(hands, dtype=np.int16)
+        self.deck = np.asarray(deck, dtype=np.int8)
+        self.deck_len = np.asarray(deck_len, dtype=np.int16)
+        self.top_color = np.asarray(top_color, dtype=np.int8)
+        self.top_value = np.asarray(top_value, dtype=np.int8)
+        self.current = np.zeros(n, dtype=np.int8) if current is None else np.asarray(current, dtype=np.int8)
+        self.direction = np.ones(n, dtype=np.int8) if direction is None else np.asarray(direction, dtype=np.int8)
+        self.turns = np.zeros(n, dtype=np.int32)
+        self.winner = np.full(n, -1, dtype=np.int8)
+        self.active = np.ones(n, dtype=bool)
+
+    def _draw(self, games, seats, counts):
+        # every listed game's seat draws up to counts cards, fewer if the deck runs out
+        for i in range(int(counts.max(initial=0))):
+            takes = (counts > i) & (self.deck_len[games] > 0)
+            g = games[takes]
+            self.deck_len[g] -= 1
+            np.add.at(self.hands, (g, seats[takes], self.deck[g, self.deck_len[g]]), 1)
+
+    def step(self):
+        """Play one turn in every game that is still running"""
+        games = np.flatnonzero(self.active)
+        if len(games) == 0:
+            return
+        faces, plays = self.choose_moves(games)
+        self.play_moves(games, faces, plays)
+
+    def choose_moves(self, games):
+        """RuleBasedAI moves for the player to move in each game: (faces, plays), plays is False to draw"""
+        seats = self.current[games].astype(np.intp)
+        hands = self.hands[games, seats]
+
+        # playable copies of each face for the player to move
+        playable = (FACE_IS_WILD[None, :]
+                    | (FACE_COLOR_ARR[None, :] == self.top_color[games, None])
+                    | (FACE_VALUE_ARR[None, :] == self.top_value[games, None]))
+        counts = hands * playable
+
+        # pick the highest priority class that has a playable card, then a uniform card in it
+        class_counts = counts @ CLASS_MASKS.T
+        has_class = class_counts > 0
+        plays = has_class.any(axis=1)
+        chosen_class = np.argmax(has_class, axis=1)
+        weights = counts * CLASS_MASKS[chosen_class]
+        totals = weights.sum(axis=1)
+        picks = (self.rng.random(len(games)) * totals).astype(np.int64)
+        faces = np.argmax(np.cumsum(weights, axis=1) > picks[:, None], axis=1)
+        return faces, plays
+
+    def play_moves(self, games, faces, plays):
+        """The player to move in each game plays the given face, or draws a card where plays is False"""
+        seats = self.current[games].astype(np.intp)
+        advance = np.ones(len(games), dtype=np.int8)
+
+        # players without a playable card draw one and pass
+        drawers = ~plays
+        if drawers.any():
+            self._draw(games[drawers], seats[drawers], np.ones(int(drawers.sum()), dtype=np.int8))
+
+        if plays.any():
+            pg = games[plays]
+            ps = seats[plays]
+            pf = faces[plays]
+            self.hands[pg, ps, pf] -= 1
+            values = FACE_VALUE_ARR[pf]
+
+            # wild cards take the most frequent color left in hand, random if there is none
+            colors = FACE_COLOR_ARR[pf].copy()
+            wild = pf >= WILD_FACE
+            if wild.any():
+                wg = pg[wild]
+                color_counts = self.hands[wg, ps[wild], :WILD_FACE].reshape(-1, NUM_COLORS, NUM_VALUES).sum(axis=2)
+                chosen = np.argmax(color_counts, axis=1)
+                no_color = color_counts.max(axis=1) == 0
+                chosen[no_color] = self.rng.integers(0, NUM_COLORS, int(no_color.sum()))
+                colors[wild] = chosen
+            self.top_color[pg] = colors
+            self.top_value[pg] = values
+
+            reverse = values == REVERSE
+            self.direction[pg[reverse]] *= -1
+            advance[plays] = ADVANCE[values]
+
+            # draw2 and wild_draw4 make the next player draw before being skipped
+            penalty = PENALTY[values]
+            hit = penalty > 0
+            if hit.any():
+                victims = (ps[hit] + self.direction[pg[hit]]) % NUM_PLAYERS
+                self._draw(pg[hit], victims, penalty[hit])
+
+            finished = self.hands[pg, ps].sum(axis=1) == 0
+            self.winner[pg[finished]] = ps[finished]
+            self.active[pg[finished]] = False
+
+        self.current[games] = (seats + self.direction[games] * advance) % NUM_PLAYERS
+        self.turns[games] += 1
+        self.active[games[self.turns[games] >= self.max_turns]] = False
+
+    def run(self):
+        """Play every game to the end, returns the winner seats (-1 if stalled) and turn counts"""
+        while self.active.any():
+            self.step()
+        return self.winner, self.turns
+
+
+def summarize(winners, turns) -> dict:
+    """Same summary as headless.summarize, computed from the batch arrays"""
+    num_games = len(winners)
+    finished = winners >= 0
+    lengths = np.sort(turns[finished])
+    return {
+        "games": num_games,
+        "win_rate": [float(np.mean(winners == seat)) for seat in range(NUM_PLAYERS)],
+        "stalled": float(np.mean(~finished)),
+        "mean_turns": float(lengths.mean()) if len(lengths) else 0.0,
+        "median_turns": int(lengths[len(lengths) // 2]) if len(lengths) else 0,
+    }
+
+
+def main(argv=None):
+    import headless
+
+    parser = argparse.ArgumentParser(description="Simulate many rule-based UNO games at once")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--max-turns", type=int, default=1000)
+    parser.add_argument("--compare", type=int, default=0,
+                        help="also play this many games with the scalar UnoGame engine")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    batch = BatchUnoGame(args.games, args.seed, args.max_turns)
+    winners, turns = batch.run()
+    elapsed = time.perf_counter() - start
+    print(f"Batch simulator ({elapsed:.2f}s)")
+    headless.print_summary(summarize(winners, turns))
+
+    if args.compare:
+        start = time.perf_counter()
+        results = headless.run_games(args.compare, args.seed, max_turns=args.max_turns)
+        elapsed = time.perf_counter() - start
+        print(f"Scalar UnoGame ({elapsed:.2f}s)")
+        headless.print_summary(headless.summarize(results))
+
+
+if __name__ == "__main__":
+    main()
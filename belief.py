@@ -0,0 +1,212 @@
+import random
+
+from card import Card, Deck
+from game import UnoGame
+from player import Player
+from faces import NUM_FACES, FACE_COLOR, FACE_COUNTS, FACE_KEYS
+from constants import COLORS
+
+FACES = range(NUM_FACES)
+
+# how much more likely a face of the chosen color becomes after a player picks it for a wild,
+# the AIs pick the most frequent color in their hand
+WILD_COLOR_WEIGHT = 2.0
+
+
+def _merged(groups) -> list:
+    # groups with the same weights become one
+    merged = []
+    for count, weights in groups:
+        for group in merged:
+            if group[1] == weights:
+                group[0] += count
+                break
+        else:
+            merged.append([count, weights])
+    return merged
+
+
+class HandBelief:
+    """
+    What one seat knows about the cards it cannot see.
+
+    Every opponent's hand is kept as groups of cards that share the same per-face weights.
+    Newly drawn cards start out unconstrained, a forced draw on a top card rules out every face
+    that could have been played on it, and choosing a wild color makes that color more likely.
+    The weights are combined with the unseen cards (full deck minus the discard pile and the
+    seat's own hand) to get probabilities and to sample full determinizations for search.
+    """
+
+    def __init__(self, game: UnoGame, seat: int):
+        self.game = game
+        self.seat = seat
+        self.reset()
+        game.add_listener(self.on_event)
+
+    def reset(self):
+        # faces that went face up to the discard pile
+        self.seen = [0] * NUM_FACES
+        for card in self.game.discard_pile:
+            self.seen[card.face] += 1
+
+        # opponent index -> list of [card count, face weights]
+        self.groups = {}
+        for i, player in enumerate(self.game.players):
+            if i != self.seat:
+                self.groups[i] = [[len(player.hand), [1.0] * NUM_FACES]]
+
+    def on_event(self, event: dict):
+        if event["type"] == "reset":
+            # a new game was dealt, nothing seen so far counts any more
+            self.reset()
+            return
+        if event["type"] in ("swap", "rotate"):
+            self._move_hands(event)
+            return
+        if event["type"] == "jump_in":
+            # the play event that follows says which card
+            return
+        player = event["player"]
+        if event["type"] == "play":
+            self.seen[event["face"]] += 1
+            if player != self.seat:
+                self._remove_card(player, event["face"])
+                if FACE_COLOR[event["face"]] < 0 and event["color"] in COLORS:
+                    self._favor_color(player, COLORS.index(event["color"]))
+        elif player != self.seat:
+            if "legal" in event:
+                # the draw was forced, so the player had none of the legal faces
+                self._rule_out(player, event["legal"])
+            self._add_cards(player, event["count"], [1.0] * NUM_FACES)
+
+    def _add_cards(self, player: int, count: int, weights: list):
+        if count <= 0:
+            return
+        for group in self.groups[player]:
+            if group[1] == weights:
+                group[0] += count
+                return
+        self.groups[player].append([count, weights])
+
+    def _remove_card(self, player: int, face: int):
+        # take the card from the group where the face was most likely
+        groups = self.groups[player]
+        if not groups:
+            return
+        best = max(groups, key=lambda group: group[1][face])
+        best[0] -= 1
+        if best[0] <= 0:
+            groups.remove(best)
+
+    def _move_hands(self, event: dict):
+        # with the 7-0 rule hands change owners, what is known about a hand goes with it
+        if event["type"] == "swap":
+            moves = {event["player"]: event["target"], event["target"]: event["player"]}
+        else:
+            count = len(self.game.players)
+            moves = {i: (i + event["direction"]) % count for i in range(count)}
+
+        groups = {}
+        for old, new in moves.items():
+            if new == self.seat:
+                continue  # the seat now sees that hand
+            if old == self.seat:
+                # the seat's old hand is known card by card, the events come after the move
+                hand = self.game.players[new].hand
+                groups[new] = _merged([[1, [1.0 if face == card.face else 0.0 for face in FACES]] for card in hand])
+            else:
+                groups[new] = self.groups[old]
+        self.groups.update(groups)
+
+    def _rule_out(self, player: int, mask: int):
+        for group in self.groups[player]:
+            group[1] = [0.0 if mask >> face & 1 else weight for face, weight in enumerate(group[1])]
+        self._merge(player)
+
+    def _favor_color(self, player: int, color_index: int):
+        for group in self.groups[player]:
+            group[1] = [weight * WILD_COLOR_WEIGHT if FACE_COLOR[face] == color_index else weight
+                        for face, weight in enumerate(group[1])]
+        self._merge(player)
+
+    def _merge(self, player: int):
+        self.groups[player] = _merged(self.groups[player])
+
+    def unseen(self) -> list:
+        """Copies of each face that are in the opponents' hands or the deck"""
+        pool = [FACE_COUNTS[face] - self.seen[face] for face in FACES]
+        for card in self.game.players[self.seat].hand:
+            pool[card.face] -= 1
+        return [max(count, 0) for count in pool]
+
+    def distribution(self, player: int) -> list:
+        """Probability of each face for a random card from the player's hand"""
+        pool = self.unseen()
+        probabilities = [0.0] * NUM_FACES
+        hand_size = 0
+        for count, weights in self.groups[player]:
+            scores = [pool[face] * weights[face] for face in FACES]
+            total = sum(scores) or 1.0
+            for face in FACES:
+                probabilities[face] += count * scores[face] / total
+            hand_size += count
+        if hand_size:
+            probabilities = [p / hand_size for p in probabilities]
+        return probabilities
+
+    def sample(self, rng=random):
+        """
+        Sample one assignment of the unseen cards consistent with the beliefs.
+        Returns ({opponent: [faces]}, [deck faces]), most constrained groups are filled first.
+        """
+        pool = self.unseen()
+        groups = []
+        for player, player_groups in self.groups.items():
+            for count, weights in player_groups:
+                tightness = sum(pool[face] * weights[face] for face in FACES)
+                groups.append((tightness, player, count, weights))
+        groups.sort(key=lambda group: group[0])
+
+        hands = {player: [] for player in self.groups}
+        for _, player, count, weights in groups:
+            for _ in range(count):
+                scores = [pool[face] * weights[face] for face in FACES]
+                if not any(scores):
+                    # the beliefs ran out of consistent cards, fall back to any unseen one
+                    scores = pool
+                if not any(scores):
+                    break
+                face = rng.choices(FACES, weights=scores)[0]
+                pool[face] -= 1
+                hands[player].append(face)
+
+        deck = [face for face in FACES for _ in range(pool[face])]
+        rng.shuffle(deck)
+        return hands, deck
+
+    def determinize(self, rng=random) -> UnoGame:
+        """Copy of the game with the hidden cards replaced by a sample from the beliefs"""
+        game = self.game
+        hands, deck_faces = self.sample(rng)
+
+        clone = UnoGame.__new__(UnoGame)
+        clone.deck = Deck.__new__(Deck)
+        clone.deck.cards = [Card(*FACE_KEYS[face]) for face in deck_faces]
+        clone.discard_pile = [Card(card.color, card.value) for card in game.discard_pile]
+        clone.players = []
+        for i, player in enumerate(game.players):
+            new_player = Player(player.name, player.position)
+            if i == self.seat:
+                new_player.hand = [Card(card.color, card.value) for card in player.hand]
+            else:
+                new_player.hand = [Card(*FACE_KEYS[face]) for face in hands[i]]
+            clone.players.append(new_player)
+
+        clone.current_player = game.current_player
+        clone.direction = game.direction
+        clone.last_wild_color = game.last_wild_color
+        clone.rules = game.rules
+        clone.pending_draw = game.pending_draw
+        clone.listeners = []
+        clone.verbose = False
+        return clone
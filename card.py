@@ -1,49 +1,20 @@
-import pygame
 import random
 from constants import *
+from faces import face_id, NUM_FACES, WILD_FACE, DECK_ORDER
+from assets import card_image
 
 class Card:
     def __init__(self, color: str, value: str):
-        # each card has a color, a number value and a rectangle image
+        # each card has a color, a number value and an image
         self.color = color
         self.value = value
+        self.face = face_id(color, value)  # compact id, stays the same when a wild gets its color
         self.image = None
-        self.rect = pygame.Rect(0, 0, CARD_WIDTH, CARD_HEIGHT)
         
     def load_image(self):
-
-        # get card-width and height
-        card_img = pygame.Surface((CARD_WIDTH, CARD_HEIGHT))
-        
-        # set the colors of the images according to their color values
-        if self.color == "red":
-            card_img.fill(RED)
-        elif self.color == "blue":
-            card_img.fill(BLUE)
-        elif self.color == "green":
-            card_img.fill(GREEN)
-        elif self.color == "yellow":
-            card_img.fill(YELLOW)
-        else:  # wild cards are black
-            card_img.fill(BLACK)
-            
-        # white border
-        pygame.draw.rect(card_img, WHITE, (3, 3, CARD_WIDTH-6, CARD_HEIGHT-6), 2)
-        
-        # print the value of the card on it
-        font = pygame.font.SysFont('Arial', 30, bold=True)
-        for dx in [-1, 0, 1]:
-            for dy in [-1, 0, 1]:
-                if dx != 0 or dy != 0:
-                    shadow = font.render(self.value, True, BLACK)
-                    shadow_rect = shadow.get_rect(center=(CARD_WIDTH/2 + dx, CARD_HEIGHT/2 + dy))
-                    card_img.blit(shadow, shadow_rect)
-        text = font.render(self.value, True, WHITE)
-        text_rect = text.get_rect(center=(CARD_WIDTH/2, CARD_HEIGHT/2))
-        card_img.blit(text, text_rect)
-        
-        self.image = card_img
-        return card_img
+        # card faces are rendered once and shared by every card with the same face
+        self.image = card_image(self.face)
+        return self.image
 
     # print card info
     def __str__(self):
@@ -84,6 +55,22 @@ class Deck:
         # shuffle all values
         self.shuffle()
         
+    def rebuild(self, cards):
+        """
+        Make a full deck out of the given cards of a finished game without creating new ones:
+        the wilds lose their chosen color and the cards are shuffled from the order build() uses,
+        so the shuffle deals the same as a new Deck would.
+        """
+        by_face = [[] for _ in range(NUM_FACES)]
+        for card in cards:
+            if card.face >= WILD_FACE:
+                card.color = "wild"
+            by_face[card.face].append(card)
+        self.cards.clear()
+        for face in DECK_ORDER:
+            self.cards.append(by_face[face].pop())
+        self.shuffle()
+
     def shuffle(self):
         random.shuffle(self.cards)
         
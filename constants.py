@@ -1,6 +1,10 @@
+import time
 import pygame
 
+# startup phases are timed from here, UnoInterface logs them once the first frame is shown
+STARTUP_START = time.perf_counter()
 pygame.init()
+STARTUP_PHASES = [("pygame init", time.perf_counter() - STARTUP_START)]
 
 # set the constants for main frame
 SCREEN_WIDTH = 1024
@@ -19,8 +23,10 @@ YELLOW = (255, 255, 0)
 GRAY = (128, 128, 128)
 
 # display the screen
+_window_start = time.perf_counter()
 screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption("Uno Game - 4 Players")
+STARTUP_PHASES.append(("window", time.perf_counter() - _window_start))
 
 # list out all possible colors and number values
 COLORS = ["red", "blue", "green", "yellow"]
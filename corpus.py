@@ -0,0 +1,280 @@
+import os
+
+# corpora are made headless
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import json
+import math
+import mmap
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import headless
+from faces import NUM_FACES, FACE_KEYS
+from fileio import save_json
+from game import UnoGame
+from player import RuleBasedAI, MinimaxAI
+from replay import GameRecorder, MAX_TURNS
+from rules import get_rules
+
+NUM_SEATS = 4
+CHUNK_SIZE = 64 * 1024 * 1024  # bytes of a corpus file read by one task, whatever the size of the file
+AGENTS = {
+    "rule": RuleBasedAI,
+    "minimax": lambda: MinimaxAI(max_depth=2, verbose=False),
+}
+
+
+class CorpusStats:
+    """
+    Aggregates over any number of game records in memory that doesn't grow with them: counters
+    per seat, agent and face, and game lengths as a histogram (a game can't be longer than the
+    max turns it was played with, so there are only ever that many buckets). Stats of separate
+    parts of a corpus merge into the stats of the whole, in any order.
+    """
+
+    def __init__(self):
+        self.games = 0
+        self.stalled = 0
+        self.wins = [0] * NUM_SEATS
+        self.agents = {}  # agent class -> [seats played, games won]
+        self.lengths = {}  # turns -> finished games that long
+        self.plays = [0] * NUM_FACES
+        self.jump_ins = 0
+        self.draws = 0
+
+    def add(self, record: dict):
+        self.games += 1
+        winner = record["winner"]
+        moves = record["moves"]
+        if winner is None:
+            self.stalled += 1
+        else:
+            self.wins[winner] += 1
+            self.lengths[len(moves)] = self.lengths.get(len(moves), 0) + 1
+        for seat, agent in enumerate(record.get("agents", ["unknown"] * NUM_SEATS)):
+            counts = self.agents.setdefault(agent, [0, 0])
+            counts[0] += 1
+            counts[1] += winner == seat
+
+        plays = self.plays
+        for move in moves:
+            if move is None:
+                self.draws += 1
+            else:
+                plays[move[0]] += 1
+                if len(move) > 3:
+                    self.jump_ins += 1
+
+    def merge(self, other: "CorpusStats") -> "CorpusStats":
+        self.games += other.games
+        self.stalled += other.stalled
+        self.wins = [a + b for a, b in zip(self.wins, other.wins)]
+        for agent, (seats, wins) in other.agents.items():
+            counts = self.agents.setdefault(agent, [0, 0])
+            counts[0] += seats
+            counts[1] += wins
+        for turns, count in other.lengths.items():
+            self.lengths[turns] = self.lengths.get(turns, 0) + count
+        self.plays = [a + b for a, b in zip(self.plays, other.plays)]
+        self.jump_ins += other.jump_ins
+        self.draws += other.draws
+        return self
+
+    def to_dict(self) -> dict:
+        return {"games": self.games, "stalled": self.stalled, "wins": self.wins, "agents": self.agents,
+                "lengths": self.lengths, "plays": self.plays, "jump_ins": self.jump_ins, "draws": self.draws}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CorpusStats":
+        stats = cls()
+        stats.__dict__.update(data)
+        # JSON object keys are strings
+        stats.lengths = {int(turns): count for turns, count in data["lengths"].items()}
+        return stats
+
+    def percentile(self, fraction: float) -> int:
+        """Length of the finished game at this fraction of them, shortest first"""
+        rank = fraction * (sum(self.lengths.values()) - 1)
+        seen = 0
+        for turns in sorted(self.lengths):
+            seen += self.lengths[turns]
+            if seen > rank:
+                return turns
+        return 0
+
+    def summary(self) -> dict:
+        finished = self.games - self.stalled
+        played = sum(self.plays)
+        # seat 0 always moves first: its win rate over the finished games against the 1 in 4 of a
+        # fair seat, with the normal approximation 95% interval
+        first = self.wins[0] / finished if finished else 0.0
+        margin = 1.96 * math.sqrt(first * (1 - first) / finished) if finished else 0.0
+        return {
+            "games": self.games,
+            "stalled": self.stalled / self.games if self.games else 0.0,
+            "win_rate": [wins / self.games if self.games else 0.0 for wins in self.wins],
+            "agent_win_rate": {agent: wins / seats for agent, (seats, wins) in sorted(self.agents.items())},
+            "mean_turns": sum(turns * count for turns, count in self.lengths.items()) / finished if finished else 0.0,
+            "median_turns": self.percentile(0.5),
+            "p90_turns": self.percentile(0.9),
+            "p99_turns": self.percentile(0.99),
+            "max_turns": max(self.lengths, default=0),
+            "first_player_advantage": first - 1 / NUM_SEATS,
+            "first_player_margin": margin,
+            "play_rate": {"/".join(FACE_KEYS[face]): count / played if played else 0.0
+                          for face, count in enumerate(self.plays)},
+            "draws_per_game": self.draws / self.games if self.games else 0.0,
+            "jump_ins_per_game": self.jump_ins / self.games if self.games else 0.0,
+        }
+
+
+def chunks(path: str, chunk_size: int = CHUNK_SIZE) -> list:
+    """(path, start, end) byte ranges covering the file, see scan for how lines are split between them"""
+    size = os.path.getsize(path)
+    return [(path, start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+
+
+def scan(path: str, start: int, end: int) -> CorpusStats:
+    """
+    Stats of the records in a byte range of a JSONL corpus. A range takes every line that starts
+    in it, so the ranges don't need to fall on line ends and each line is read exactly once. The
+    file is memory-mapped: only the pages being read are in memory, however big the file.
+    """
+    stats = CorpusStats()
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if start:
+            # the line running over the start belongs to the range before
+            newline = data.find(b"\n", start - 1)
+            start = len(data) if newline < 0 else newline + 1
+        data.seek(start)
+        while data.tell() < end:
+            line = data.readline()
+            if line.strip():
+                stats.add(json.loads(line))
+    return stats
+
+
+def aggregate(paths, workers=None, chunk_size: int = CHUNK_SIZE) -> CorpusStats:
+    """Stats of all the records in the files, their chunks scanned in parallel and merged as they finish"""
+    tasks = [task for path in paths for task in chunks(path, chunk_size)]
+    total = CorpusStats()
+    if workers == 1 or len(tasks) <= 1:
+        for task in tasks:
+            total.merge(scan(*task))
+        return total
+    with ProcessPoolExecutor(workers) as pool:
+        for future in as_completed([pool.submit(scan, *task) for task in tasks]):
+            total.merge(future.result())
+    return total
+
+
+def write_shard(path: str, seeds, agent_names, max_turns: int = MAX_TURNS, rules=None) -> int:
+    """
+    Play one game per seed and write their records to path, one JSON line each. The agents
+    rotate one seat per seed, so every agent plays every seat equally often. The rules come as
+    their options, the effect tables of a rule set don't pickle.
+    """
+    rules = get_rules(**rules) if rules else None
+    agents = [AGENTS[name]() for name in agent_names]
+    game = None
+    with open(path, "w") as f:
+        for seed in seeds:
+            random.seed(seed)
+            if game is None:
+                game = UnoGame(rules)
+                game.verbose = False
+            else:
+                game.reset()
+            shift = seed % NUM_SEATS
+            seated = agents[shift:] + agents[:shift]
+            recorder = GameRecorder(game, seed)
+            winner, _ = headless.play_game(seated, max_turns, game)
+            recorder.close()
+            f.write(json.dumps(recorder.record(winner, seated), separators=(",", ":")))
+            f.write("\n")
+    return len(seeds)
+
+
+def generate(prefix: str, games: int, shards: int, seed: int = 0, agent_names=("rule",) * NUM_SEATS,
+             max_turns: int = MAX_TURNS, rules=None, workers=None) -> list:
+    """Write a corpus of games as shards prefix-000.jsonl, ..., played in parallel, returns their paths"""
+    paths = [f"{prefix}-{shard:03d}.jsonl" for shard in range(shards)]
+    seeds = list(range(seed, seed + games))
+    with ProcessPoolExecutor(workers) as pool:
+        options = rules.options() if rules is not None else None
+        futures = [pool.submit(write_shard, path, seeds[shard::shards], list(agent_names), max_turns, options)
+                   for shard, path in enumerate(paths)]
+        for future in futures:
+            future.result()
+    return paths
+
+
+def print_report(summary: dict, top: int = 10) -> None:
+    headless.print_summary(summary)
+    print(f"  Game length: p90 {summary['p90_turns']}, p99 {summary['p99_turns']}, "
+          f"longest {summary['max_turns']} turns")
+    print(f"  First player advantage: {summary['first_player_advantage']:+.4f} "
+          f"± {summary['first_player_margin']:.4f} over a fair 0.25")
+    for agent, rate in summary["agent_win_rate"].items():
+        print(f"  {agent} win rate per seat played: {rate:.3f}")
+    print(f"  Draws per game: {summary['draws_per_game']:.1f}, jump-ins per game: {summary['jump_ins_per_game']:.2f}")
+    print("  Most played cards:")
+    for face, rate in sorted(summary["play_rate"].items(), key=lambda item: -item[1])[:top]:
+        print(f"    {face}: {rate:.3%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate self-play corpora and aggregate statistics over them")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    make = commands.add_parser("generate", help="play games and write their records as JSONL shards")
+    make.add_argument("prefix")
+    make.add_argument("--games", type=int, default=10000)
+    make.add_argument("--shards", type=int, default=os.cpu_count() or 1)
+    make.add_argument("--seed", type=int, default=0)
+    make.add_argument("--agents", default="rule,rule,rule,rule",
+                      help=f"the agent of each seat before rotating, from {', '.join(sorted(AGENTS))}")
+    make.add_argument("--max-turns", type=int, default=MAX_TURNS)
+    make.add_argument("--workers", type=int, default=None)
+    make.add_argument("--stacking", action="store_true", help="house rule: draw cards can be stacked")
+    make.add_argument("--jump-in", action="store_true", help="house rule: identical cards can be played out of turn")
+    make.add_argument("--seven-zero", action="store_true", help="house rule: 7 swaps hands, 0 passes them on")
+
+    stats = commands.add_parser("stats", help="aggregate statistics over JSONL corpus files")
+    stats.add_argument("paths", nargs="*")
+    stats.add_argument("--workers", type=int, default=None)
+    stats.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, metavar="BYTES")
+    stats.add_argument("--merge", nargs="*", default=[], metavar="PARTIAL",
+                       help="partial stats saved with --save, from other shards or machines, to add in")
+    stats.add_argument("--save", default=None, metavar="PARTIAL", help="write the merged counts to this file")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.command == "generate":
+        agent_names = args.agents.split(",")
+        if len(agent_names) != NUM_SEATS or not set(agent_names) <= set(AGENTS):
+            parser.error(f"--agents needs {NUM_SEATS} of {', '.join(sorted(AGENTS))}")
+        rules = get_rules(stacking=args.stacking, jump_in=args.jump_in, seven_zero=args.seven_zero)
+        paths = generate(args.prefix, args.games, args.shards, args.seed, agent_names, args.max_turns,
+                         rules, args.workers)
+        seconds = time.perf_counter() - start
+        print(f"Wrote {args.games} games to {len(paths)} shards in {seconds:.1f} s ({args.games / seconds:.0f} games/s)")
+        return
+
+    total = aggregate(args.paths, args.workers, args.chunk_size)
+    for path in args.merge:
+        with open(path) as f:
+            total.merge(CorpusStats.from_dict(json.load(f)))
+    seconds = time.perf_counter() - start
+    if args.save:
+        save_json(args.save, total.to_dict())
+    size = sum(os.path.getsize(path) for path in args.paths)
+    print(f"Read {size / 2 ** 20:.1f} MiB in {seconds:.1f} s ({total.games / max(seconds, 1e-9):.0f} games/s)")
+    print_report(total.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import os
+
+# the generator runs headless
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import hashlib
+import itertools
+import time
+
+import numpy as np
+
+from faces import (NUM_FACES, NUM_COLORS, NUM_VALUES, WILD_FACE, ALL_VALUES, FACE_COLOR, FACE_VALUE,
+                   FACE_COUNTS)
+from constants import COLORS
+import batch_sim
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "endgame.tbl")
+
+MAGIC = b"UNOEND1\0"
+HEADER_SIZE = 64
+
+MAX_HAND = 2  # positions where the player to move holds at most this many cards
+MAX_OPPONENT_CARDS = 3  # and every opponent holds at most this many
+NUM_TOP_VALUES = len(ALL_VALUES)
+
+# one-card hands come first, then every unordered pair of faces
+HAND_SLOTS = NUM_FACES + NUM_FACES * (NUM_FACES + 1) // 2
+
+# each entry stores the win chance for: play hand[0], play hand[1], draw a card
+ACTIONS = 3
+DRAW_ACTION = 2
+NOT_LEGAL = 255  # values are win chances scaled to 0..254
+
+
+def rules_fingerprint(max_opponent_cards: int = MAX_OPPONENT_CARDS) -> bytes:
+    """Hash of everything the table depends on, a rules change gives a different fingerprint"""
+    digest = hashlib.sha256()
+    for table in (batch_sim.FULL_DECK, batch_sim.ADVANCE, batch_sim.PENALTY,
+                  batch_sim.CLASS_MASKS, batch_sim.FACE_COLOR_ARR, batch_sim.FACE_VALUE_ARR):
+        digest.update(np.ascontiguousarray(table).tobytes())
+    digest.update(repr((batch_sim.NUM_PLAYERS, MAX_HAND, max_opponent_cards, ACTIONS)).encode())
+    return digest.digest()[:16]
+
+
+def canonicalize(hand, top_color: int):
+    """
+    Relabel colors so the top card's color is 0 and the other colors give the smallest hand.
+    Returns the sorted canonical hand and the color mapping (old color index -> new one).
+    """
+    others = [color for color in range(NUM_COLORS) if color != top_color]
+    best = None
+    for order in itertools.permutations(range(1, NUM_COLORS)):
+        mapping = [0] * NUM_COLORS
+        mapping[top_color] = 0
+        for color, new_color in zip(others, order):
+            mapping[color] = new_color
+        faces = tuple(sorted(_recolor(face, mapping) for face in hand))
+        if best is None or faces < best[0]:
+            best = (faces, mapping)
+    return best
+
+
+def _recolor(face: int, mapping) -> int:
+    if face >= WILD_FACE:
+        return face
+    return mapping[FACE_COLOR[face]] * NUM_VALUES + FACE_VALUE[face]
+
+
+def hand_slot(hand) -> int:
+    # hand is a sorted tuple of one or two faces
+    if len(hand) == 1:
+        return hand[0]
+    a, b = hand
+    return NUM_FACES + a * NUM_FACES - a * (a - 1) // 2 + (b - a)
+
+
+def entry_index(hand, top_value: int, opponent_counts, max_opponent_cards: int) -> int:
+    """Row of a canonical position, opponent counts are listed in turn order after the player"""
+    opponents = 0
+    for count in opponent_counts:
+        opponents = opponents * max_opponent_cards + (count - 1)
+    return (hand_slot(hand) * NUM_TOP_VALUES + top_value) * max_opponent_cards ** 3 + opponents
+
+
+def canonical_positions(max_opponent_cards: int = MAX_OPPONENT_CARDS):
+    """Every canonical (hand, top value, opponent counts) position the table holds"""
+    hands = [(face,) for face in range(NUM_FACES)]
+    hands += list(itertools.combinations_with_replacement(range(NUM_FACES), 2))
+    counts = list(itertools.product(range(1, max_opponent_cards + 1), repeat=3))
+    for hand in hands:
+        if canonicalize(hand, 0)[0] != hand:
+            continue
+        for top_value in range(NUM_TOP_VALUES):
+            # skip positions that need more copies of a face than the deck has
+            used = list(hand) + [_top_face(top_value)]
+            if any(used.count(face) > FACE_COUNTS[face] for face in used):
+                continue
+            for opponent_counts in counts:
+                yield hand, top_value, opponent_counts
+
+
+def _top_face(top_value: int) -> int:
+    # face of a canonical top card with this value, wild tops are the wild faces
+    if top_value >= NUM_VALUES:
+        return WILD_FACE + top_value - NUM_VALUES
+    return top_value
+
+
+def _is_playable(face: int, top_value: int) -> bool:
+    # the canonical top card always has color 0
+    return face >= WILD_FACE or FACE_COLOR[face] == 0 or FACE_VALUE[face] == top_value
+
+
+def _simulate(positions, rollouts: int, rng, max_turns: int):
+    """Win chance of every action of every position, estimated with rule-based rollouts"""
+    rows = []  # (position number, action, face played or -1)
+    for number, (hand, top_value, _) in enumerate(positions):
+        for action, face in enumerate(hand):
+            if _is_playable(face, top_value):
+                rows.append((number, action, face))
+        rows.append((number, DRAW_ACTION, -1))
+
+    n = len(rows) * rollouts
+    hands = np.zeros((n, batch_sim.NUM_PLAYERS, NUM_FACES), dtype=np.int16)
+    deck = np.zeros((n, len(batch_sim.FULL_DECK)), dtype=np.int8)
+    deck_len = np.zeros(n, dtype=np.int16)
+    top_value = np.zeros(n, dtype=np.int8)
+    forced = np.zeros(n, dtype=np.intp)
+
+    for row, (number, action, face) in enumerate(rows):
+        hand, top, opponent_counts = positions[number]
+        games = slice(row * rollouts, (row + 1) * rollouts)
+
+        # the unseen cards are everything but the player's hand and a top card of the position
+        pool = np.bincount(batch_sim.FULL_DECK, minlength=NUM_FACES)
+        for card in hand:
+            pool[card] -= 1
+        pool[_top_face(top)] -= 1
+        cards = np.repeat(np.arange(NUM_FACES, dtype=np.int8), pool)
+        shuffled = rng.permuted(np.tile(cards, (rollouts, 1)), axis=1)
+
+        # the opponents get their cards from the top of the shuffled deck
+        size = len(cards)
+        remaining = size - sum(opponent_counts)
+        seats = np.repeat(np.arange(1, batch_sim.NUM_PLAYERS), opponent_counts)
+        deal = shuffled[:, remaining:size]
+        for column, seat in enumerate(seats):
+            np.add.at(hands[games, seat], (np.arange(rollouts), deal[:, column]), 1)
+        for card in hand:
+            hands[games, 0, card] += 1
+        deck[games, :size] = shuffled
+        deck_len[games] = remaining
+        top_value[games] = top
+        forced[games] = face
+
+    sim = batch_sim.BatchUnoGame(n, rng, max_turns, deal=False)
+    sim.set_state(hands, deck, deck_len, np.zeros(n, dtype=np.int8), top_value)
+
+    # the first move is the action being valued, rule-based play takes over after it
+    games = np.arange(n)
+    sim.play_moves(games, np.maximum(forced, 0), forced >= 0)
+    winners, _ = sim.run()
+
+    wins = (winners == 0).reshape(len(rows), rollouts).mean(axis=1)
+    values = np.full((len(positions), ACTIONS), NOT_LEGAL, dtype=np.uint8)
+    for row, (number, action, _) in enumerate(rows):
+        values[number, action] = int(round(wins[row] * (NOT_LEGAL - 1)))
+    return values
+
+
+def generate(path: str = DEFAULT_PATH, rollouts: int = 64, max_opponent_cards: int = MAX_OPPONENT_CARDS,
+             seed=None, chunk: int = 500, max_turns: int = 200):
+    """Estimate every canonical endgame position and write the table to path"""
+    rng = np.random.default_rng(seed)
+    size = HAND_SLOTS * NUM_TOP_VALUES * max_opponent_cards ** 3
+    table = np.full((size, ACTIONS), NOT_LEGAL, dtype=np.uint8)
+
+    positions = list(canonical_positions(max_opponent_cards))
+    start = time.perf_counter()
+    for first in range(0, len(positions), chunk):
+        batch = positions[first:first + chunk]
+        values = _simulate(batch, rollouts, rng, max_turns)
+        for position, row in zip(batch, values):
+            table[entry_index(*position, max_opponent_cards)] = row
+        done = min(first + chunk, len(positions))
+        print(f"{done}/{len(positions)} positions ({time.perf_counter() - start:.0f}s)")
+
+    header = MAGIC + rules_fingerprint(max_opponent_cards) + bytes([max_opponent_cards])
+    with open(path, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(table.tobytes())
+
+
+class EndgameTable:
+    """Memory-mapped endgame table written by generate(), probed in constant time"""
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an endgame table")
+        self.max_opponent_cards = header[len(MAGIC) + 16]
+        if header[len(MAGIC):len(MAGIC) + 16] != rules_fingerprint(self.max_opponent_cards):
+            raise ValueError(f"{path} was generated for different rules, regenerate it")
+        self.table = np.memmap(path, dtype=np.uint8, mode="r", offset=HEADER_SIZE).reshape(-1, ACTIONS)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_PATH):
+        """The table at path, or None if it is missing or out of date"""
+        try:
+            return cls(path)
+        except (OSError, ValueError) as e:
+            print(f"Endgame table not used: {e}")
+            return None
+
+    def probe(self, hand, top_color: int, top_value: int, opponent_counts):
+        """
+        Win chances for playing each card of the hand (None where it can't be played) and for
+        drawing, or None if the position is not in the table.
+        """
+        if not 1 <= len(hand) <= MAX_HAND or top_color < 0:
+            return None
+        if any(not 1 <= count <= self.max_opponent_cards for count in opponent_counts):
+            return None
+
+        faces, mapping = canonicalize(hand, top_color)
+        row = self.table[entry_index(faces, top_value, opponent_counts, self.max_opponent_cards)]
+        values = [None if value == NOT_LEGAL else int(value) / (NOT_LEGAL - 1) for value in row]
+
+        # the canonical hand is sorted, put the values back in the order of the given hand
+        recolored = [_recolor(face, mapping) for face in hand]
+        hand_values = [values[faces.index(face)] for face in recolored]
+        return hand_values, values[DRAW_ACTION]
+
+    def probe_game(self, game, seat: int):
+        """probe() for the given seat when it is to move in a UnoGame"""
+        hand = [card.face for card in game.players[seat].hand]
+        top_card = game.get_top_card()
+        if top_card.color not in COLORS:
+            return None
+        top_value = ALL_VALUES.index(top_card.value)
+        opponents = [len(game.players[(seat + game.direction * step) % batch_sim.NUM_PLAYERS].hand)
+                     for step in range(1, batch_sim.NUM_PLAYERS)]
+        return self.probe(hand, COLORS.index(top_card.color), top_value, opponents)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute the endgame lookup table")
+    parser.add_argument("--output", default=DEFAULT_PATH)
+    parser.add_argument("--rollouts", type=int, default=64)
+    parser.add_argument("--max-opponent-cards", type=int, default=MAX_OPPONENT_CARDS)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--chunk", type=int, default=500)
+    args = parser.parse_args(argv)
+    generate(args.output, args.rollouts, args.max_opponent_cards, args.seed, args.chunk)
+
+
+if __name__ == "__main__":
+    main()
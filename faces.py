@@ -0,0 +1,92 @@
+from constants import COLORS, VALUES, SPECIAL_CARDS
+
+# every distinct card face gets a small integer id: the 52 colored faces are laid out
+# color by color (red 0..draw2, blue 0..draw2, ...) and the two wild faces come last
+NUM_COLORS = len(COLORS)
+NUM_VALUES = len(VALUES)
+WILD_FACE = NUM_COLORS * NUM_VALUES
+WILD_DRAW4_FACE = WILD_FACE + 1
+NUM_FACES = WILD_FACE + len(SPECIAL_CARDS)
+
+# value ids continue after the colored values so "wild" and "wild_draw4" stay distinct
+ALL_VALUES = VALUES + SPECIAL_CARDS
+ACTION_VALUES = ["skip", "reverse", "draw2"]
+
+FACE_COLOR = []   # color index of each face, -1 for the wild faces
+FACE_VALUE = []   # index into ALL_VALUES
+FACE_COUNTS = []  # how many copies of the face a full deck holds
+FACE_KEYS = []   # (color, value) of a card with the face
+
+for color_index, color in enumerate(COLORS):
+    for value_index, value in enumerate(VALUES):
+        FACE_COLOR.append(color_index)
+        FACE_VALUE.append(value_index)
+        FACE_COUNTS.append(1 if value == "0" else 2)
+        FACE_KEYS.append((color, value))
+
+for special_index, special in enumerate(SPECIAL_CARDS):
+    FACE_COLOR.append(-1)
+    FACE_VALUE.append(NUM_VALUES + special_index)
+    FACE_COUNTS.append(4)
+    FACE_KEYS.append(("wild", special))
+
+# faces in the order Deck.build creates the cards: color by color, then the wilds in turns
+DECK_ORDER = [face for face in range(WILD_FACE) for _ in range(FACE_COUNTS[face])]
+DECK_ORDER += list(range(WILD_FACE, NUM_FACES)) * FACE_COUNTS[WILD_FACE]
+
+_FACE_IDS = {}
+for face in range(WILD_FACE):
+    _FACE_IDS[(COLORS[FACE_COLOR[face]], VALUES[FACE_VALUE[face]])] = face
+# wild cards keep their face after a color is chosen for them
+for color in COLORS + ["wild"]:
+    _FACE_IDS[(color, "wild")] = WILD_FACE
+    _FACE_IDS[(color, "wild_draw4")] = WILD_DRAW4_FACE
+
+
+def face_id(color: str, value: str) -> int:
+    return _FACE_IDS[(color, value)]
+
+
+def card_face(card) -> int:
+    return face_id(card.color, card.value)
+
+
+def hand_counts(hand) -> list:
+    # compact hand representation: number of copies held of each face
+    counts = [0] * NUM_FACES
+    for card in hand:
+        counts[card.face] += 1
+    return counts
+
+
+# bitmask representation: bit f is set when face f is present
+ACTION_MASK = 0
+NUMBER_MASK = 0
+WILD_MASK = 0
+for face in range(NUM_FACES):
+    if FACE_COLOR[face] < 0:
+        WILD_MASK |= 1 << face
+    elif ALL_VALUES[FACE_VALUE[face]] in ACTION_VALUES:
+        ACTION_MASK |= 1 << face
+    else:
+        NUMBER_MASK |= 1 << face
+
+_PLAYABLE_MASKS = {}
+
+
+def playable_mask(color: str, value: str) -> int:
+    """Faces that can be played on a top card with this color and value, same as UnoGame.is_valid_move"""
+    mask = _PLAYABLE_MASKS.get((color, value))
+    if mask is None:
+        mask = WILD_MASK
+        for face in range(WILD_FACE):
+            if COLORS[FACE_COLOR[face]] == color or VALUES[FACE_VALUE[face]] == value:
+                mask |= 1 << face
+        _PLAYABLE_MASKS[(color, value)] = mask
+    return mask
+
+
+# every top card a game can show, filled up front so agents on other threads only ever read the table
+for _color in COLORS + ["wild"]:
+    for _value in ALL_VALUES:
+        playable_mask(_color, _value)
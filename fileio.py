@@ -0,0 +1,10 @@
+import json
+import os
+
+
+def save_json(path: str, data: dict):
+    # written next to the target and renamed over it, so an interrupted run never leaves half a file
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
@@ -1,10 +1,16 @@
 from card import Card, Deck
 from player import Player
+from rules import RuleSet, STANDARD_RULES
+from faces import WILD_FACE
 import random
 from typing import Optional
 
 class UnoGame:
-    def __init__(self):
+    verbose = True  # set to False to play without printing every move
+    rules = STANDARD_RULES  # house rules, see rules.py
+    pending_draw = 0  # cards stacked up for the player to move, only with draw-stacking
+
+    def __init__(self, rules: Optional[RuleSet] = None):
         # starts deck and discard pile, initialize each player
         self.deck = Deck()
         self.discard_pile = []
@@ -18,6 +24,9 @@ class UnoGame:
         self.direction = 1  # 1: clockwise, -1: counter-clockwise
         
         self.last_wild_color = None  # tracks chosen wild card colors
+        self.listeners = []  # callbacks that receive the public game events
+        if rules is not None:
+            self.rules = rules
         
         self.setup_game()
         
@@ -37,24 +46,103 @@ class UnoGame:
             
         self.discard_pile.append(first_card)
         
+    def reset(self):
+        """
+        Start a new game with the same cards, players and lists, nothing grows with the games played.
+        It deals exactly what a new UnoGame would with the same random state.
+        """
+        cards = self.deck.cards + self.discard_pile
+        self.discard_pile.clear()
+        for player in self.players:
+            cards += player.hand
+            player.hand.clear()
+        self.deck.rebuild(cards)
+
+        self.current_player = 0
+        self.direction = 1
+        self.last_wild_color = None
+        self.pending_draw = 0
+        self.setup_game()
+        self.emit({"type": "reset"})
+
+    def log(self, message: str):
+        if self.verbose:
+            print(message)
+
+    def add_listener(self, listener):
+        # listener(event) is called with a dict for every public event: "play", "draw", "pass" and "reset",
+        # plus "jump_in", "swap" and "rotate" with the house rules that have them
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def emit(self, event: dict):
+        for listener in self.listeners:
+            listener(event)
+
     def get_top_card(self):
         if self.discard_pile:
             return self.discard_pile[-1]
         return None
         
     def is_valid_move(self, card: Card) -> bool:
-        top_card = self.get_top_card()
+        # wild cards always go, other cards match the top card in color or value, the rule set
+        # knows the faces that are legal right now
+        return bool(self.rules.legal_mask(self) >> card.face & 1)
+
+    def legal_mask(self) -> int:
+        """Bitmask of the faces the player to move may play"""
+        return self.rules.legal_mask(self)
 
-        # Always allow wild and wild_draw4 cards to be played 
-        if card.value in ["wild", "wild_draw4"]:
-            return True
+    def legal_moves(self, player: Player) -> list:
+        """Indices of the cards in the player's hand that can be played now"""
+        legal = self.rules.legal_mask(self)
+        return [i for i, card in enumerate(player.hand) if legal >> card.face & 1]
 
-        # if not wild card, should match in color or value
-        if card.color == top_card.color or card.value == top_card.value:
-            return True
+    def choose_swap_target(self, seat: int) -> int:
+        # with the 7-0 rule, a 7 swaps with the opponent closest to winning, the first in turn order on ties
+        opponents = [(seat + self.direction * step) % len(self.players) for step in range(1, len(self.players))]
+        return min(opponents, key=lambda i: len(self.players[i].hand))
+
+    def jump_in_moves(self) -> list:
+        """(seat, card index) of every card identical to the top card outside the current player's hand"""
+        if not self.rules.jump_in:
+            return []
+        top_card = self.get_top_card()
+        if top_card.face >= WILD_FACE:
+            return []
+        moves = []
+        for step in range(1, len(self.players)):
+            seat = (self.current_player + self.direction * step) % len(self.players)
+            for i, card in enumerate(self.players[seat].hand):
+                if card.face == top_card.face:
+                    moves.append((seat, i))
+                    break
+        return moves
+
+    def jump_in(self, seat: int, card_index: int) -> bool:
+        """Play an identical copy of the top card out of turn, play goes on from the seat"""
+        hand = self.players[seat].hand
+        top_card = self.get_top_card()
+        if (not self.rules.jump_in or top_card.face >= WILD_FACE or not 0 <= card_index < len(hand)
+                or hand[card_index].face != top_card.face):
+            return False
+        self.log(f"{self.players[seat].name} jumps in!")
+        self.emit({"type": "jump_in", "player": seat})
+        self.current_player = seat
+        return self.play_card(card_index)
 
-        return False
+    def choose_wild_color(self, hand) -> str:
+        # chooses the most frequent color in the hand or random if no colored cards
+        colors = {"red": 0, "blue": 0, "green": 0, "yellow": 0}
+        for c in hand:
+            if c.color in colors:
+                colors[c.color] += 1
 
+        if all(count == 0 for count in colors.values()):
+            return random.choice(["red", "blue", "green", "yellow"])
+        return max(colors, key=colors.get)
         
     def play_card(self, card_index: int) -> bool:
         # get current player
@@ -67,18 +155,9 @@ class UnoGame:
             # stores original values before any modification
             original_value = card.value
             
-            # handles wild color selection
-            if original_value in ["wild", "wild_draw4"] and self.current_player != 0:
-                colors = {"red": 0, "blue": 0, "green": 0, "yellow": 0}
-                for c in player.hand:
-                    if c.color in colors:
-                        colors[c.color] += 1
-                
-                # chooses the most frequent color or random if no colored cards
-                if all(count == 0 for count in colors.values()):
-                    chosen_color = random.choice(["red", "blue", "green", "yellow"])
-                else:
-                    chosen_color = max(colors, key=colors.get)
+            # handles wild color selection, unless the color was already chosen for the card
+            if original_value in ["wild", "wild_draw4"] and self.current_player != 0 and card.color == "wild":
+                chosen_color = self.choose_wild_color(player.hand)
                 
                 # checks the validity of the move
                 valid_move = self.is_valid_move(card)
@@ -87,7 +166,7 @@ class UnoGame:
                 if valid_move:
                     card.color = chosen_color
                     self.last_wild_color = chosen_color
-                    print(f"{player.name} chose {chosen_color} for wild card")
+                    self.log(f"{player.name} chose {chosen_color} for wild card")
                 else:
                     return False
             else:
@@ -95,67 +174,51 @@ class UnoGame:
                 valid_move = self.is_valid_move(card)
                 
             if valid_move:
-                print(f"{player.name} is playing: {card.color} {card.value}")
+                self.log(f"{player.name} is playing: {card.color} {card.value}")
 
                 # remove the card from hand and add to discard pile 
                 played_card = player.play_card(card_index)
 
                 self.discard_pile.append(played_card)
+                self.emit({"type": "play", "player": self.current_player, "index": card_index,
+                           "face": played_card.face, "color": played_card.color})
 
-                # handle special cards with another function
-                if original_value in ["skip", "draw2", "wild_draw4", "reverse"]:
-                    self.handle_special_card(played_card)
-                else:
-                    self.next_turn()
+                # the card's effect comes from the rule set, it also passes the turn on
+                self.rules.effects[played_card.face](self, played_card)
 
-                print(f"{player.name} played {card.color} {card.value}")
+                self.log(f"{player.name} played {card.color} {card.value}")
+                self.log(f"Turn now goes to: {self.players[self.current_player].name}")
                 
                 return True  # successful move
                 
         return False  # invalid move
         
-    def handle_special_card(self, card: Card):
-        """Handle special cards and manage turn transitions properly"""        
-        # Skip: next player misses a turn
-        if card.value == "skip":
-            print(f"Skip card played! Next player will be skipped.")
-            # move to next player + skip them
-            self.next_turn() 
-            skipped_player = self.players[self.current_player]
-            print(f"{skipped_player.name} is skipped!")
-            self.next_turn()  # move to the player after the skipped one
-            
-        # Reverse: change direction
-        elif card.value == "reverse":
-            print(f"Reverse card played! Direction changed.")
-            self.direction *= -1
-            self.next_turn()
-            
-        # Draw 2: next player draws 2 cards and misses a turn
-        elif card.value == "draw2":
-            self.next_turn()  # move to next player
-            affected_player = self.players[self.current_player]
-            affected_player.draw(self.deck, 2)
-            print(f"{affected_player.name} draws 2 cards and is skipped!")
-            self.next_turn()  # skip the affected player
-            
-        # Wild Draw 4: next player draws 4 cards and misses a turn
-        elif card.value == "wild_draw4":
-            self.next_turn()  # move to next player
-            affected_player = self.players[self.current_player]
-            affected_player.draw(self.deck, 4)
-            print(f"{affected_player.name} draws 4 cards and is skipped!")
-            self.next_turn()  # skip the affected player
-            
-        print(f"Turn now goes to: {self.players[self.current_player].name}")
-            
+    def draw_penalty(self, player, count: int):
+        # the player draws as many of the cards as the deck still has
+        hand_size = len(player.hand)
+        player.draw(self.deck, count)
+        self.emit({"type": "draw", "player": player.position, "count": len(player.hand) - hand_size})
+
     def next_turn(self):
         self.current_player = (self.current_player + self.direction) % 4
         
     def draw_from_deck(self):
         player = self.players[self.current_player]
-        player.draw(self.deck, 1)
-        print(f"{player.name} drew a card from deck")
+        top_card = self.get_top_card()
+        legal = self.rules.legal_mask(self)
+        # a player can also draw with a card they could have played, only a forced draw says anything
+        forced = not self.legal_moves(player)
+        hand_size = len(player.hand)
+        # a stack of draw cards is drawn instead of the one card
+        player.draw(self.deck, self.pending_draw or 1)
+        self.pending_draw = 0
+        event = {"type": "pass", "player": self.current_player, "count": len(player.hand) - hand_size,
+                 "color": top_card.color, "value": top_card.value}
+        if forced:
+            # the others learn there was no legal card, "legal" are the faces
+            event["legal"] = legal
+        self.emit(event)
+        self.log(f"{player.name} drew {len(player.hand) - hand_size} card(s) from deck")
         self.next_turn()
 
     def play_card_silent(self, card_index: int) -> bool:
@@ -171,16 +234,7 @@ class UnoGame:
             original_value = card.value            
             # Handle wild color selection
             if original_value in ["wild", "wild_draw4"] and self.current_player != 0:
-                colors = {"red": 0, "blue": 0, "green": 0, "yellow": 0}
-                for c in player.hand:
-                    if c.color in colors:
-                        colors[c.color] += 1
-                
-                # choose most frequent color or random if no colored cards
-                if all(count == 0 for count in colors.values()):
-                    chosen_color = random.choice(["red", "blue", "green", "yellow"])
-                else:
-                    chosen_color = max(colors, key=colors.get)
+                chosen_color = self.choose_wild_color(player.hand)
               
                 valid_move = self.is_valid_move(card)
                 
@@ -200,49 +254,18 @@ class UnoGame:
                 # Add to discard pile
                 self.discard_pile.append(played_card)
 
-                # handle special cards
-                if original_value in ["skip", "draw2", "wild_draw4", "reverse"]:
-                    self.handle_special_card_silent(played_card)
-                else:
-                    self.next_turn()
+                # same effects as play_card, a search game has verbose off and no listeners
+                self.rules.effects[played_card.face](self, played_card)
                 
                 return True  
                 
         return False  
 
-    def handle_special_card_silent(self, card: Card):
-        """Silent version of handle_special_card for AI simulations"""        
-        # Skip: next player misses a turn
-        if card.value == "skip":
-            # move to next player, then skip them
-            self.next_turn()  
-            self.next_turn() 
-            
-        # Reverse: change direction
-        elif card.value == "reverse":
-            self.direction *= -1
-            # in a 4-player game, reverse acts like skip
-            self.next_turn()
-            self.next_turn()
-            
-        # Draw 2: next player draws 2 cards and misses a turn
-        elif card.value == "draw2":
-            self.next_turn()  # move to next player
-            affected_player = self.players[self.current_player]
-            affected_player.draw(self.deck, 2)
-            self.next_turn()  # skip the affected player
-            
-        # Wild Draw 4: next player draws 4 cards and misses a turn
-        elif card.value == "wild_draw4":
-            self.next_turn()  # move to next player
-            affected_player = self.players[self.current_player]
-            affected_player.draw(self.deck, 4)
-            self.next_turn()  # skip the affected player
-
     def draw_from_deck_silent(self):
         """Silent version of draw_from_deck for AI simulations"""
         player = self.players[self.current_player]
-        player.draw(self.deck, 1)
+        player.draw(self.deck, self.pending_draw or 1)
+        self.pending_draw = 0
         self.next_turn()
 
     def check_winner(self) -> Optional[str]:
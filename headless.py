@@ -0,0 +1,248 @@
+import os
+
+# headless runs never open a real window
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import contextlib
+import gc
+import random
+import time
+import tracemalloc
+from typing import Optional
+
+from game import UnoGame
+from player import RuleBasedAI
+from profiler import Profiler, SAMPLE_INTERVAL
+from rules import get_rules
+
+DEFAULT_MAX_TURNS = 1000
+MAX_WARMUP_GAMES = 5000  # the memory audit stops warming up the caches after this many games
+# what the memory audit lets a run grow by after the warm-up and still call it flat
+MEMORY_TOLERANCE = 64 * 1024  # traced bytes
+MAX_NEW_OBJECTS = 100
+PROFILE_PHASES = ["ai", "engine"]  # what each turn's time is split into with --profile
+
+# the game engine prints every move, headless runs send that output here
+_devnull = open(os.devnull, "w")
+
+
+def play_turn(game: UnoGame, agent, profile=None) -> None:
+    """Let the agent for the current seat play one turn, same as UnoInterface.ai_play_turn"""
+    player = game.players[game.current_player]
+    move_index = agent.choose_move(player, game)
+    if profile:
+        profile.lap("ai")
+
+    if move_index is not None and move_index < len(player.hand):
+        card = player.hand[move_index]
+        # the engine only picks wild colors for the AI seats, so seat 0 picks like the human would
+        if game.current_player == 0 and card.value in ["wild", "wild_draw4"]:
+            card.color = game.choose_wild_color(player.hand)
+            game.last_wild_color = card.color
+        if not game.play_card(move_index):
+            game.draw_from_deck()
+    else:
+        game.draw_from_deck()
+    if profile:
+        profile.lap("engine")
+        profile.end_frame()
+
+
+def play_game(agents=None, max_turns: int = DEFAULT_MAX_TURNS, game: Optional[UnoGame] = None, profile=None):
+    """
+    Play one full game without a window and return (winner seat, turns played).
+    The winner is None if nobody finished within max_turns (the deck is never reshuffled,
+    so a game can stall once it runs out).
+    """
+    if agents is None:
+        rule_based_ai = RuleBasedAI()
+        agents = [rule_based_ai] * 4
+
+    with contextlib.redirect_stdout(_devnull):
+        if game is None:
+            game = UnoGame()
+        if profile:
+            profile.lap("engine")  # dealing counts as engine time
+
+        turns = 0
+        jump_in = game.rules.jump_in
+        while turns < max_turns:
+            played = len(game.discard_pile)
+            play_turn(game, agents[game.current_player], profile)
+            turns += 1
+            # with jump-in the first seat in turn order holding a copy of a card just played
+            # plays it, the AIs never pass up getting rid of a card
+            while jump_in and len(game.discard_pile) > played and not game.check_winner():
+                played = len(game.discard_pile)
+                for seat, index in game.jump_in_moves()[:1]:
+                    game.jump_in(seat, index)
+                    turns += 1
+            for seat, player in enumerate(game.players):
+                if len(player.hand) == 0:
+                    return seat, turns
+
+    return None, turns
+
+
+def run_games(num_games: int, seed: Optional[int] = None, agents=None,
+              max_turns: int = DEFAULT_MAX_TURNS, profile=None, rules=None):
+    """Play num_games headless games and return the list of (winner seat, turns) results"""
+    if seed is not None:
+        random.seed(seed)
+    if agents is None:
+        agents = [RuleBasedAI()] * 4
+
+    # one game is dealt again for every run, so a long run allocates nothing per game
+    results = []
+    game = None
+    for _ in range(num_games):
+        if game is None:
+            game = UnoGame(rules)
+        else:
+            game.reset()
+        results.append(play_game(agents, max_turns, game, profile))
+    return results
+
+
+def summarize(results) -> dict:
+    """Win rate per seat and game length statistics for a list of (winner, turns) results"""
+    num_games = len(results)
+    wins = [0, 0, 0, 0]
+    lengths = []
+    stalled = 0
+    for winner, turns in results:
+        if winner is None:
+            stalled += 1
+        else:
+            wins[winner] += 1
+            lengths.append(turns)
+
+    lengths.sort()
+    summary = {
+        "games": num_games,
+        "win_rate": [count / num_games for count in wins],
+        "stalled": stalled / num_games,
+        "mean_turns": sum(lengths) / len(lengths) if lengths else 0.0,
+        "median_turns": lengths[len(lengths) // 2] if lengths else 0,
+    }
+    return summary
+
+
+def print_summary(summary: dict) -> None:
+    print(f"Games played: {summary['games']}")
+    for seat, rate in enumerate(summary["win_rate"]):
+        print(f"  Player {seat + 1} win rate: {rate:.3f}")
+    print(f"  Stalled games: {summary['stalled']:.3f}")
+    print(f"  Game length: mean {summary['mean_turns']:.1f}, median {summary['median_turns']} turns")
+
+
+def memory_audit(num_games: int, seed: Optional[int] = None, checkpoints: int = 10,
+                 max_turns: int = DEFAULT_MAX_TURNS, max_warmup: int = MAX_WARMUP_GAMES):
+    """
+    Play num_games on one reused game under tracemalloc and return (games played, traced bytes,
+    live objects) before the first and at every checkpoint. A long session is memory-bounded if
+    these stay flat.
+
+    The agent's class cache grows over the first few hundred games until it holds cache_size
+    entries, and its dict grows once more when the evictions have used up its free slots, so
+    warm-up games are played until it is full and then as many again (at most max_warmup in
+    all). Only the games after them are measured.
+    """
+    if seed is not None:
+        random.seed(seed)
+    agent = RuleBasedAI()
+    agents = [agent] * 4
+    every = max(num_games // checkpoints, 1)
+
+    # traced from the start, so what the warm-up allocates and later frees is counted both ways
+    tracemalloc.start()
+    game = UnoGame()
+    warmup = 0
+    while len(agent.class_cache) < agent.cache_size and warmup < max_warmup:
+        if warmup:
+            game.reset()
+        play_game(agents, max_turns, game)
+        warmup += 1
+    for _ in range(min(warmup, max_warmup - warmup)):
+        game.reset()
+        play_game(agents, max_turns, game)
+
+    gc.collect()
+    rows = [(0, tracemalloc.get_traced_memory()[0], len(gc.get_objects()))]
+    for played in range(1, num_games + 1):
+        game.reset()
+        play_game(agents, max_turns, game)
+        if played % every == 0:
+            gc.collect()
+            rows.append((played, tracemalloc.get_traced_memory()[0], len(gc.get_objects())))
+    tracemalloc.stop()
+    return rows
+
+
+def memory_growth(rows):
+    """(bytes per game, bytes grown over the run, live objects added) for memory_audit rows"""
+    # dicts resize and free lists fill, so single checkpoints move a little either way, the
+    # least squares slope over all of them is what grows with the games played
+    games = [row[0] for row in rows]
+    traced = [row[1] for row in rows]
+    mean_games = sum(games) / len(games)
+    mean_traced = sum(traced) / len(traced)
+    spread = sum((x - mean_games) ** 2 for x in games) or 1
+    slope = sum((x - mean_games) * (y - mean_traced) for x, y in zip(games, traced)) / spread
+    return slope, slope * (games[-1] - games[0]), rows[-1][2] - rows[0][2]
+
+
+def print_memory_audit(rows, seconds: float, tolerance: int = MEMORY_TOLERANCE) -> bool:
+    """Print the checkpoints, returns False if memory grows with the games played"""
+    for played, traced, objects in rows:
+        when = f"after {played} games" if played else "after the warm-up"
+        print(f"  {when}: {traced / 1024:.1f} KiB traced, {objects} objects")
+
+    slope, growth, objects = memory_growth(rows)
+    print(f"  {rows[-1][0] / seconds:.0f} games/s, {slope:.3f} bytes per game ({growth / 1024:.1f} KiB over the run), "
+          f"{objects} more live objects")
+    flat = growth < tolerance and objects < MAX_NEW_OBJECTS
+    print("  memory is flat" if flat else "  memory grows with the games played")
+    return flat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play UNO games without a window")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--max-turns", type=int, default=DEFAULT_MAX_TURNS)
+    parser.add_argument("--profile", nargs="?", const="profile", default=None, metavar="PREFIX",
+                        help="write PREFIX.folded flame graph data and PREFIX.frames.txt turn timings")
+    parser.add_argument("--sample-interval", type=float, default=SAMPLE_INTERVAL)
+    parser.add_argument("--switch-interval", type=float, default=None, metavar="SECONDS",
+                        help="interpreter switch interval while profiling, shorter spreads the samples "
+                             "out but makes every thread switch more often")
+    parser.add_argument("--memory-audit", action="store_true",
+                        help="check with tracemalloc that memory stays flat over --games reused games")
+    parser.add_argument("--stacking", action="store_true", help="house rule: draw cards can be stacked")
+    parser.add_argument("--jump-in", action="store_true", help="house rule: identical cards can be played out of turn")
+    parser.add_argument("--seven-zero", action="store_true", help="house rule: 7 swaps hands, 0 passes them on")
+    args = parser.parse_args(argv)
+    rules = get_rules(stacking=args.stacking, jump_in=args.jump_in, seven_zero=args.seven_zero)
+
+    if args.memory_audit:
+        start = time.perf_counter()
+        rows = memory_audit(args.games, args.seed, max_turns=args.max_turns)
+        flat = print_memory_audit(rows, time.perf_counter() - start)
+        raise SystemExit(0 if flat else 1)
+
+    profile = (Profiler(args.profile, PROFILE_PHASES, args.sample_interval, unit="turn",
+                        switch_interval=args.switch_interval) if args.profile else None)
+    if profile:
+        profile.start()
+    try:
+        results = run_games(args.games, args.seed, max_turns=args.max_turns, profile=profile, rules=rules)
+    finally:
+        if profile:
+            profile.stop()
+    print_summary(summarize(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,185 @@
+import os
+import random
+import time
 import pygame
 from game import UnoGame
 from constants import *
 from player import RuleBasedAI, MinimaxAI
 from card import Card
+from belief import HandBelief
+from layout import HandLayout, DECK_POS, DISCARD_POS, HOVER_LIFT, in_rect
+from replay import GameRecorder, Replay
+import assets
+
+try:
+    from endgame import EndgameTable
+except ImportError:  # numpy is only needed for the precomputed endgame table
+    EndgameTable = None
 
 class UnoInterface:
-    def __init__(self):
+    PROFILE_PHASES = ["events", "ai", "draw", "flip", "wait"]  # what each frame's time is split into
+
+    def __init__(self, record_path=None, profile=None):
+        self.setup_window(profile)
+
+        phase_start = time.perf_counter()
+        # a recorded game is dealt from a known seed so the replay viewer can deal it again
+        self.record_path = record_path
+        self.games_played = 0
+        seed = self.seed_game()
         self.game = UnoGame()
-        self.clock = pygame.time.Clock()
-        self.selected_card_index = -1
-        self.font = pygame.font.SysFont('Arial', 20)
-        self.title_font = pygame.font.SysFont('Arial', 36, bold=True)
+        self.recorder = GameRecorder(self.game, seed) if record_path else None
         self.last_player_turn = -1  # prevents player from doing multiple moves per turn
         
         # initialize both type of players: rule based and Minimax AI
         self.rule_based_ai = RuleBasedAI()
-        self.minimax_ai = MinimaxAI(max_depth=3)
+        # the minimax AI searches over its beliefs about the other hands, not the hands themselves
+        self.minimax_belief = HandBelief(self.game, 2)
+        endgame = EndgameTable.load() if EndgameTable else None
+        self.minimax_ai = MinimaxAI(max_depth=3, belief=self.minimax_belief, endgame=endgame)
+        STARTUP_PHASES.append(("game and agents", time.perf_counter() - phase_start))
+
+    def setup_window(self, profile=None):
+        """The loading frame, fonts, card images and drawing state, everything but the game itself"""
+        self.profile = profile  # a profiler.Profiler, None unless --profile is given
+        self.font = assets.get_font(20)
+        self.title_font = assets.get_font(36, bold=True)
+
+        # show the window right away, the rest of the startup happens behind this frame
+        phase_start = time.perf_counter()
+        screen.fill(BLACK)
+        loading = self.title_font.render("Loading...", True, WHITE)
+        screen.blit(loading, loading.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)))
+        pygame.display.flip()
+        STARTUP_PHASES.append(("loading frame", time.perf_counter() - phase_start))
+
+        # card faces come from the atlas on disk, or get rendered a few per frame in run()
+        phase_start = time.perf_counter()
+        self.assets_ready = assets.load_atlas()
+        STARTUP_PHASES.append(("card atlas" if self.assets_ready else "no card atlas", time.perf_counter() - phase_start))
+
+        self.overlay = None
+        self.clock = pygame.time.Clock()
+        self.selected_card_index = -1
+        # card slots per seat, only laid out again when a hand changes size
+        self.layouts = {}
+        self.name_labels = {}
+        self.mouse_pos = (-1, -1)
+        self.hover = None  # index of the raised card in the human's hand, as last drawn
+        self.startup_logged = False
+
+    def log_startup(self):
+        # printed once, after the first full frame is on screen
+        phases = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in STARTUP_PHASES)
+        print(f"Startup: {phases}")
+        print(f"Time to first frame: {(time.perf_counter() - STARTUP_START) * 1000:.0f} ms")
+        self.startup_logged = True
         
     def run(self):
+        profile = self.profile
         running = True
         while running:
             # check for the winner first, if false proceed with the rest of the loop
             winner = self.game.check_winner()
             if winner:
+                self.save_record()
                 self.draw_game()  # shows final state and displays winner
-                self.show_winner(winner) 
+                self.show_winner(winner)
+                prompt = self.font.render("Click to play again", True, WHITE)
+                screen.blit(prompt, prompt.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 50)))
+                if profile:
+                    profile.lap("draw")
                 pygame.display.flip()
-                pygame.time.delay(5000) 
-                running = False
-                continue 
+                if profile:
+                    profile.lap("flip")
+                running = self.wait_for_new_game()
+                if profile:
+                    profile.lap("wait")
+                if running:
+                    self.new_game()
+                if profile:
+                    profile.lap("events")
+                    profile.end_frame()
+                continue
 
             # handle other events like quitting, and clicking on the screen
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    self.save_record()
                     running = False
                 elif event.type == pygame.MOUSEBUTTONDOWN:
                     if event.button == 1:
                         self.handle_click(event.pos)
+                elif event.type == pygame.MOUSEMOTION:
+                    self.mouse_pos = event.pos
+            if profile:
+                profile.lap("events")
 
-            # AI players' turn
+            # AI players' turn, it laps its own phases
             self.ai_play_turn()
 
+            # finish rendering the card faces in small steps so no frame stalls on them
+            if not self.assets_ready:
+                self.assets_ready = assets.preload_step()
+
             self.draw_game()
+            if profile:
+                profile.lap("draw")
 
             # update the display 
             pygame.display.flip()
+            if not self.startup_logged:
+                self.log_startup()
+            if profile:
+                profile.lap("flip")
             self.clock.tick(30)
+            if profile:
+                profile.lap("wait")
+                profile.end_frame()
 
         pygame.quit()
-        
+
+    def seed_game(self):
+        # recorded games are dealt from a seed of their own
+        if not self.record_path:
+            return None
+        seed = random.randrange(1 << 32)
+        random.seed(seed)
+        return seed
+
+    def wait_for_new_game(self) -> bool:
+        # True when the player clicks for another game, False if they close the window
+        while True:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return False
+                if event.type in (pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN):
+                    return True
+            self.clock.tick(30)
+
+    def new_game(self):
+        # the same cards, players and images are dealt again, nothing is allocated per game
+        seed = self.seed_game()
+        self.game.reset()
+        if self.record_path:
+            self.recorder = GameRecorder(self.game, seed)
+        self.selected_card_index = -1
+        self.last_player_turn = -1
+
+    def save_record(self):
+        if self.recorder is not None:
+            winner = next((seat for seat, player in enumerate(self.game.players) if not player.hand), None)
+            # later games go next to the first one: game.json, game-2.json, ...
+            self.games_played += 1
+            path = self.record_path
+            if self.games_played > 1:
+                root, ext = os.path.splitext(path)
+                path = f"{root}-{self.games_played}{ext}"
+            self.recorder.save(path, winner)
+            self.recorder.close()
+            print(f"Game recorded to {path}")
+            self.recorder = None
+
     def handle_click(self, pos):
         # get the current player information
         current_player = self.game.players[self.game.current_player]
@@ -56,24 +187,21 @@ class UnoInterface:
         # if the player is number 0(human player), then let them click on cards
         if self.game.current_player == 0:
             # the player should be clicking a card on their hand + the position should match + the move should be valid
-            for i, card in enumerate(current_player.hand):
-                if card.rect.collidepoint(pos):
-                    if self.game.is_valid_move(current_player.hand[i]):
-                        card = current_player.hand[i]
-                        if card.value in ["wild", "wild_draw4"]:
-                            self.selected_card_index = i  # save the card index to play later
-                            self.show_color_chooser()     # prompt the color after wild card
-                        else:
-                            self.game.play_card(i)
+            # cards overlap, the layout finds the one drawn on top
+            i = self.hand_layout(current_player).hit(pos, self.hover)
+            if i is not None:
+                card = current_player.hand[i]
+                if self.game.is_valid_move(card):
+                    if card.value in ["wild", "wild_draw4"]:
+                        self.selected_card_index = i  # save the card index to play later
+                        self.show_color_chooser()     # prompt the color after wild card
                     else:
-                        print(f"Invalid move: {card.color} {card.value}")
-                    break
-                    
+                        self.game.play_card(i)
+                else:
+                    print(f"Invalid move: {card.color} {card.value}")
+
             # check for when the player clicks the deck
-            deck_rect = pygame.Rect(SCREEN_WIDTH//2 - CARD_WIDTH - 20, 
-                                   SCREEN_HEIGHT//2 - CARD_HEIGHT//2,
-                                   CARD_WIDTH, CARD_HEIGHT)
-            if deck_rect.collidepoint(pos):
+            elif in_rect(pos, DECK_POS):
                 self.game.draw_from_deck()
                 print("Drew a card from the deck")
                 
@@ -89,7 +217,13 @@ class UnoInterface:
             
             print(f"\n=== {current_player.name}'s Turn ===")
             
+            profile = self.profile
+            if profile:
+                profile.lap("events")
+            # a pause so the human can follow the AI moves, it is waiting rather than thinking
             pygame.time.delay(2000)
+            if profile:
+                profile.lap("wait")
             
             move_index = None
             
@@ -103,6 +237,8 @@ class UnoInterface:
             elif self.game.current_player == 3:  # Player with index 3 is rule-based
                 print(f"{current_player.name} thinking...")
                 move_index = self.rule_based_ai.choose_move(current_player, self.game)
+            if profile:
+                profile.lap("ai")
             
             # if move is valid, make the move
             if move_index is not None and move_index < len(current_player.hand):
@@ -121,9 +257,16 @@ class UnoInterface:
             print(f"=== End of {current_player.name}'s Turn ===")
             print(f"Next player: {self.game.players[self.game.current_player].name}\n")
             
+            # playing the move counts as events, same as a human's click
+            if profile:
+                profile.lap("events")
             # display update
             self.draw_game()
+            if profile:
+                profile.lap("draw")
             pygame.display.flip()
+            if profile:
+                profile.lap("flip")
             
         # resetting the turn tracker if turn changes back to human or when current player changes
         if self.game.current_player == 0 or self.last_player_turn == self.game.current_player:
@@ -157,21 +300,9 @@ class UnoInterface:
   
 
     def draw_deck(self):
-        # black deck display in the middle
-        deck_img = pygame.Surface((CARD_WIDTH, CARD_HEIGHT))
-        deck_img.fill(BLACK)
-        pygame.draw.rect(deck_img, WHITE, (3, 3, CARD_WIDTH-6, CARD_HEIGHT-6), 2)
-        
-        # the UNO text
-        font = pygame.font.SysFont('Arial', 30, bold=True)
-        text = font.render("UNO", True, WHITE)
-        text_rect = text.get_rect(center=(CARD_WIDTH/2, CARD_HEIGHT/2))
-        deck_img.blit(text, text_rect)
-        
-        deck_rect = pygame.Rect(SCREEN_WIDTH//2 - CARD_WIDTH - 20, 
-                               SCREEN_HEIGHT//2 - CARD_HEIGHT//2,
-                               CARD_WIDTH, CARD_HEIGHT)
-        screen.blit(deck_img, deck_rect)
+        # black deck display in the middle with the UNO text
+        deck_img = assets.card_back(30)
+        screen.blit(deck_img, DECK_POS)
         
         # shows how many card remain in the deck
         count_text = self.font.render(f"Deck: {len(self.game.deck.cards)} cards", True, WHITE)
@@ -184,97 +315,66 @@ class UnoInterface:
             top_card = self.game.discard_pile[-1]
             if not top_card.image:
                 top_card.load_image()
-                
-            discard_rect = pygame.Rect(SCREEN_WIDTH//2 + 20, 
-                                     SCREEN_HEIGHT//2 - CARD_HEIGHT//2,
-                                     CARD_WIDTH, CARD_HEIGHT)
-            screen.blit(top_card.image, discard_rect)
+
+            screen.blit(top_card.image, DISCARD_POS)
             
             # shows how many cards are in the discard pile
             count_text = self.font.render(f"Discard: {len(self.game.discard_pile)} cards", True, WHITE)
             screen.blit(count_text, (SCREEN_WIDTH//2 + 20, 
                                    SCREEN_HEIGHT//2 + CARD_HEIGHT//2 + 10))
         
+    def hand_layout(self, player):
+        # the slots only depend on how many cards the hand holds
+        layout = self.layouts.get(player.position)
+        if layout is None or layout.num_cards != len(player.hand):
+            layout = HandLayout(player.position, len(player.hand))
+            self.layouts[player.position] = layout
+        return layout
+
+    def name_label(self, player):
+        label = self.name_labels.get(player.name)
+        if label is None:
+            label = self.font.render(player.name, True, WHITE)
+            self.name_labels[player.name] = label
+        return label
+
     def draw_player_hand(self, player):
-        num_cards = len(player.hand)
-        
-        # calculating screen positioning based on the player number
-        if player.position == 0:  # bottom
-            start_x = SCREEN_WIDTH//2 - (num_cards * (CARD_WIDTH - CARD_SPACING))//2
-            y = SCREEN_HEIGHT - CARD_HEIGHT - 20
-            rotation = 0
-            face_up = True
-        elif player.position == 1:  # left
-            start_x = 20
-            y = SCREEN_HEIGHT//2 - (num_cards * (CARD_WIDTH//3))//2
-            rotation = 90
-            face_up = True  # change the value to see/not see the AI cards
-        elif player.position == 2:  # top
-            start_x = SCREEN_WIDTH//2 - (num_cards * (CARD_WIDTH - CARD_SPACING))//2
-            y = 60
-            rotation = 0
-            face_up = True  # change the value to see/not see the AI cards
-        else:  # right
-            start_x = SCREEN_WIDTH - CARD_WIDTH - 20
-            y = SCREEN_HEIGHT//2 - (num_cards * (CARD_WIDTH//3))//2
-            rotation = 90
-            face_up = True  # change the value to see/not see the AI cards
-            
+        layout = self.hand_layout(player)
+        rotation = 0 if layout.horizontal else 90
+        face_up = True  # change the value to see/not see the AI cards
+
         # Draw player name
-        name_text = self.font.render(player.name, True, WHITE)
-        if player.position == 0:
-            screen.blit(name_text, (SCREEN_WIDTH//2 - name_text.get_width()//2, y - 30))
+        name_text = self.name_label(player)
+        if player.position in (0, 2):
+            screen.blit(name_text, (SCREEN_WIDTH//2 - name_text.get_width()//2, layout.y - 30))
         elif player.position == 1:
-            screen.blit(name_text, (start_x, y - 30))
-        elif player.position == 2:
-            screen.blit(name_text, (SCREEN_WIDTH//2 - name_text.get_width()//2, y - 30))
+            screen.blit(name_text, (layout.x, layout.y - 30))
         else:
-            screen.blit(name_text, (start_x - name_text.get_width(), y - 30))
-            
+            screen.blit(name_text, (layout.x - name_text.get_width(), layout.y - 30))
+
+        # the card under the mouse is raised while the human picks a move
+        hover = None
+        if player.position == 0:
+            if self.game.current_player == 0:
+                # a raised card is hit where it is drawn, so the hover stays put at its edges
+                hover = layout.hit(self.mouse_pos, self.hover)
+            self.hover = hover
+
         # for each card in player's hand, show card info for face-up ones, show UNO image for face-down cards
         for i, card in enumerate(player.hand):
+            # the images come from the asset cache, already rotated for the side players
             if face_up:
                 if not card.image:
                     card.load_image()
-                card_img = card.image
+                card_img = card.image if rotation == 0 else assets.rotated_card_image(card.face, rotation)
             else:
-                
-                card_img = pygame.Surface((CARD_WIDTH, CARD_HEIGHT))
-                card_img.fill(BLACK)
-                pygame.draw.rect(card_img, WHITE, (3, 3, CARD_WIDTH-6, CARD_HEIGHT-6), 2)
-                
-                font = pygame.font.SysFont('Arial', 20, bold=True)
-                text = font.render("UNO", True, WHITE)
-                text_rect = text.get_rect(center=(CARD_WIDTH/2, CARD_HEIGHT/2))
-                card_img.blit(text, text_rect)
-
-            # the card should face the player's position
-            if player.position == 0:
-                card_x = start_x + i * (CARD_WIDTH - CARD_SPACING)
-                card.rect = pygame.Rect(card_x, y, CARD_WIDTH, CARD_HEIGHT)
-            elif player.position == 1:
-                card_x = start_x
-                card_y = y + i * (CARD_WIDTH//3)
-                card.rect = pygame.Rect(card_x, card_y, CARD_WIDTH, CARD_HEIGHT)
-                # handling the rotating cards
-            elif player.position == 2:
-                card_x = start_x + i * (CARD_WIDTH - CARD_SPACING)
-                card.rect = pygame.Rect(card_x, y, CARD_WIDTH, CARD_HEIGHT)
-            else:
-                card_x = start_x
-                card_y = y + i * (CARD_WIDTH//3)
-                card.rect = pygame.Rect(card_x, card_y, CARD_WIDTH, CARD_HEIGHT)
+                card_img = assets.card_back(20, rotation)
 
-            
-            if rotation == 0:
-                screen.blit(card_img, (card.rect.x, card.rect.y))
+            if i == hover:
+                x, y = layout.slots[i]
+                screen.blit(card_img, (x, y - HOVER_LIFT))
             else:
-                rotated_img = pygame.transform.rotate(card_img, rotation)
-                if player.position == 1:
-                    screen.blit(rotated_img, (card_x, card_y))
-                else:
-                    screen.blit(rotated_img, (card_x, card_y))
-
+                screen.blit(card_img, layout.slots[i])
 
     def show_color_chooser(self):
         # function for choosing the color after a wild card
@@ -286,6 +386,12 @@ class UnoInterface:
             "yellow": pygame.Rect(650, 250, 100, 100)
         }
 
+        # the frame ends where the choice starts, the time the human takes is a frame of its own
+        profile = self.profile
+        if profile:
+            profile.lap("events")
+            profile.end_frame()
+
         while choosing:
             screen.fill(BLACK)
             text = self.title_font.render("Choose a color", True, WHITE)
@@ -306,6 +412,9 @@ class UnoInterface:
                 elif event.type == pygame.MOUSEBUTTONDOWN:
                     for color, rect in color_buttons.items():
                         if rect.collidepoint(event.pos):
+                            if profile:
+                                profile.lap("wait")
+                                profile.end_frame()
                             self.play_selected_wild_card(color)
                             choosing = False
                             break
@@ -330,11 +439,111 @@ class UnoInterface:
 
     def show_winner(self, winner_name):
         # the function for display settings of the winner message
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        overlay.set_alpha(200)
-        overlay.fill(BLACK)
-        screen.blit(overlay, (0, 0))
+        if self.overlay is None:
+            self.overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+            self.overlay.set_alpha(200)
+            self.overlay.fill(BLACK)
+        screen.blit(self.overlay, (0, 0))
         
         win_text = self.title_font.render(f"{winner_name} WINS!", True, YELLOW)
         text_rect = win_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
         screen.blit(win_text, text_rect)
+
+
+class ReplayInterface(UnoInterface):
+    """Steps through a recorded game in the same renderer, playback advances with the frame clock"""
+
+    SPEEDS = [0.25, 0.5, 1, 2, 4, 8, 16, 32]
+    TURNS_PER_SECOND = 2  # at speed 1
+    BAR_RECT = (20, SCREEN_HEIGHT - 10, SCREEN_WIDTH - 40, 6)
+
+    def __init__(self, replay: Replay):
+        # only the window, the recorded game replaces the live game and its agents
+        self.setup_window()
+        self.replay = replay
+        self.game = replay.seek(0)
+        self.playing = False
+        self.speed_index = self.SPEEDS.index(1)
+        self.pending_turns = 0.0  # playback progress that hasn't made a full turn yet
+        self.status_text = None
+        self.status_label = None
+
+    def seek(self, turn: int):
+        self.game = self.replay.seek(turn)
+        self.pending_turns = 0.0
+
+    def run(self):
+        running = True
+        while running:
+            seconds = self.clock.tick(30) / 1000
+
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.KEYDOWN:
+                    self.handle_key(event.key)
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                    # clicking the progress bar jumps to that turn
+                    x, y, width, height = self.BAR_RECT
+                    if in_rect(event.pos, (x, y - 10), width, height + 20):
+                        self.seek(round((event.pos[0] - x) / width * len(self.replay)))
+
+            # playback moves a few turns per frame at most, so frames keep coming at any speed
+            if self.playing:
+                self.pending_turns += seconds * self.TURNS_PER_SECOND * self.SPEEDS[self.speed_index]
+                turns = int(self.pending_turns)
+                if turns:
+                    self.pending_turns -= turns
+                    self.game = self.replay.seek(self.replay.turn + turns)
+                if self.replay.turn >= len(self.replay):
+                    self.playing = False
+
+            if not self.assets_ready:
+                self.assets_ready = assets.preload_step()
+
+            self.draw_game()
+            self.draw_status()
+            winner = self.game.check_winner()
+            if winner:
+                self.show_winner(winner)
+            pygame.display.flip()
+
+        pygame.quit()
+
+    def handle_key(self, key):
+        turn = self.replay.turn
+        if key == pygame.K_SPACE:
+            if turn >= len(self.replay):
+                self.seek(0)
+            self.playing = not self.playing
+        elif key == pygame.K_RIGHT:
+            self.seek(turn + 1)
+        elif key == pygame.K_LEFT:
+            self.seek(turn - 1)
+        elif key == pygame.K_PAGEUP:
+            self.seek(turn + 10)
+        elif key == pygame.K_PAGEDOWN:
+            self.seek(turn - 10)
+        elif key == pygame.K_HOME:
+            self.seek(0)
+        elif key == pygame.K_END:
+            self.seek(len(self.replay))
+        elif key == pygame.K_UP:
+            self.speed_index = min(self.speed_index + 1, len(self.SPEEDS) - 1)
+        elif key == pygame.K_DOWN:
+            self.speed_index = max(self.speed_index - 1, 0)
+
+    def draw_status(self):
+        # the label is only rendered again when the text changes
+        state = "playing" if self.playing else "paused"
+        text = (f"Replay turn {self.replay.turn}/{len(self.replay)}  x{self.SPEEDS[self.speed_index]:g}  {state}"
+                f"  (space, arrows, page up/down, home/end)")
+        if text != self.status_text:
+            self.status_text = text
+            self.status_label = self.font.render(text, True, WHITE)
+        screen.blit(self.status_label, (20, 80))
+
+        x, y, width, height = self.BAR_RECT
+        pygame.draw.rect(screen, WHITE, self.BAR_RECT, 1)
+        done = width * self.replay.turn // max(len(self.replay), 1)
+        pygame.draw.rect(screen, YELLOW, (x, y, done, height))
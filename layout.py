@@ -0,0 +1,73 @@
+from constants import SCREEN_WIDTH, SCREEN_HEIGHT, CARD_WIDTH, CARD_HEIGHT, CARD_SPACING
+
+# the piles in the middle never move
+DECK_POS = (SCREEN_WIDTH//2 - CARD_WIDTH - 20, SCREEN_HEIGHT//2 - CARD_HEIGHT//2)
+DISCARD_POS = (SCREEN_WIDTH//2 + 20, SCREEN_HEIGHT//2 - CARD_HEIGHT//2)
+
+HOVER_LIFT = 20  # pixels the card under the mouse is raised in the human's hand
+
+
+def in_rect(pos, corner, width: int = CARD_WIDTH, height: int = CARD_HEIGHT) -> bool:
+    return 0 <= pos[0] - corner[0] < width and 0 <= pos[1] - corner[1] < height
+
+
+class HandLayout:
+    """
+    Where the cards of one hand go on screen. The cards sit in a row, each one a fixed stride
+    after the previous one and drawn over it, so a point maps to a card with a division.
+    """
+
+    def __init__(self, position: int, num_cards: int):
+        self.position = position
+        self.num_cards = num_cards
+
+        if position in (0, 2):  # bottom and top, cards overlap left to right
+            self.stride = CARD_WIDTH - CARD_SPACING
+            self.x = SCREEN_WIDTH//2 - (num_cards * self.stride)//2
+            self.y = SCREEN_HEIGHT - CARD_HEIGHT - 20 if position == 0 else 60
+            self.horizontal = True
+        else:  # left and right, the rotated cards overlap top to bottom
+            self.stride = CARD_WIDTH//3
+            self.x = 20 if position == 1 else SCREEN_WIDTH - CARD_WIDTH - 20
+            self.y = SCREEN_HEIGHT//2 - (num_cards * self.stride)//2
+            self.horizontal = False
+        # either way a card spans CARD_WIDTH along the row and CARD_HEIGHT across it
+        self.length, self.thickness = CARD_WIDTH, CARD_HEIGHT
+
+        if self.horizontal:
+            self.slots = [(self.x + i * self.stride, self.y) for i in range(num_cards)]
+        else:
+            self.slots = [(self.x, self.y + i * self.stride) for i in range(num_cards)]
+
+    def hit(self, pos, lifted=None):
+        """Index of the topmost card under pos, or None. The card at index lifted is drawn HOVER_LIFT higher."""
+        i = self._hit_row(pos)
+        if lifted is None or not 0 <= lifted < self.num_cards or (i is not None and i > lifted):
+            # later cards are drawn over the lifted one
+            return i
+        width, height = (self.length, self.thickness) if self.horizontal else (self.thickness, self.length)
+        x, y = self.slots[lifted]
+        if in_rect(pos, (x, y - HOVER_LIFT), width, height):
+            return lifted
+        if i == lifted:
+            # the strip the lifted card left uncovered shows the cards before it
+            for j in range(lifted - 1, -1, -1):
+                if in_rect(pos, self.slots[j], width, height):
+                    return j
+            return None
+        return i
+
+    def _hit_row(self, pos):
+        # with every card in its slot
+        if self.num_cards == 0:
+            return None
+        dx = pos[0] - self.x
+        dy = pos[1] - self.y
+        along, across = (dx, dy) if self.horizontal else (dy, dx)
+        if along < 0 or not 0 <= across < self.thickness:
+            return None
+        # later cards are drawn on top, so the last slot that starts before the point wins
+        i = min(along // self.stride, self.num_cards - 1)
+        if along - i * self.stride >= self.length:
+            return None
+        return i
@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import server as uno_server
+from faces import NUM_COLORS, NUM_VALUES, WILD_FACE, playable_mask
+from views import ViewState
+
+
+def choose_face(view: ViewState):
+    """The lowest playable face in the hand, or None to draw"""
+    playable = playable_mask(*view.top_card())
+    for face, count in enumerate(view.hand):
+        if count and playable >> face & 1:
+            return face
+    return None
+
+
+def most_common_color(view: ViewState) -> str:
+    counts = [sum(view.hand[color * NUM_VALUES:(color + 1) * NUM_VALUES]) for color in range(NUM_COLORS)]
+    return uno_server.COLORS[counts.index(max(counts))]
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class LoadClient:
+    """One connection that keeps a number of tables busy, each with one remote seat and three bots"""
+
+    def __init__(self, reader, writer, tables: int, seats):
+        self.reader = reader
+        self.writer = writer
+        self.tables = tables
+        self.seats = seats
+        self.pending = {}  # table id -> time the last move was sent
+        self.views = {}  # table id -> ViewState
+        self.latencies = []
+        self.received = 0  # bytes of state messages
+        self.games = 0
+        self.running = True
+
+    def send(self, message: dict):
+        self.writer.write(uno_server.encode(message))
+
+    def new_table(self):
+        self.send({"op": "new_table", "seats": self.seats, "join": True})
+
+    async def run(self):
+        for _ in range(self.tables):
+            self.new_table()
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            if message.get("t") is not None:
+                self.received += len(line)
+            self.handle(message)
+            if not self.running and not self.pending:
+                break
+
+    def handle(self, message: dict):
+        if "t" in message:
+            self.handle_view(message)
+            return
+        kind = message["type"]
+        if kind == "game_over":
+            self.games += 1
+            self.pending.pop(message["table"], None)
+            self.views.pop(message["table"], None)
+            if self.running:
+                self.new_table()
+        elif kind == "error":
+            print(f"Server error: {message['message']}")
+
+    def handle_view(self, message: dict):
+        table = message["tb"]
+        view = self.views.setdefault(table, ViewState())
+        if not view.apply(message):
+            self.send({"op": "resync", "table": table})
+            return
+        sent = self.pending.pop(table, None)
+        if sent is not None:
+            self.latencies.append(time.perf_counter() - sent)
+        # the state after a winning move still names a next player, the game_over follows it
+        game_over = 0 in view.counts
+        if self.running and not game_over and view.current == view.seat and table not in self.pending:
+            self.move(table, view)
+
+    def move(self, table: int, view: ViewState):
+        face = choose_face(view)
+        if face is None:
+            move = {"op": "draw", "table": table}
+        else:
+            move = {"op": "play", "table": table, "face": face}
+            if face >= WILD_FACE:
+                move["color"] = most_common_color(view)
+        self.pending[table] = time.perf_counter()
+        self.send(move)
+
+
+async def run_load(tables: int, duration: float, connections: int, seats, host, port, unix_path):
+    """
+    Keep the tables busy for duration seconds, returns (moves per second, p50, p99 latency, games,
+    state bytes received per remote move)
+    """
+    clients = []
+    for i in range(connections):
+        if unix_path:
+            reader, writer = await asyncio.open_unix_connection(unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        share = tables // connections + (1 if i < tables % connections else 0)
+        clients.append(LoadClient(reader, writer, share, seats))
+
+    tasks = [asyncio.ensure_future(client.run()) for client in clients]
+    await asyncio.sleep(duration)
+    for client in clients:
+        client.running = False
+    # let the moves in flight come back, then hang up
+    await asyncio.wait(tasks, timeout=1)
+    for task in tasks:
+        task.cancel()
+    for client in clients:
+        client.writer.close()
+
+    latencies = [latency for client in clients for latency in client.latencies]
+    games = sum(client.games for client in clients)
+    received = sum(client.received for client in clients)
+    return (len(latencies) / duration, percentile(latencies, 0.5), percentile(latencies, 0.99), games,
+            received / max(len(latencies), 1))
+
+
+def report(tables: int, result):
+    moves_per_second, p50, p99, games, received = result
+    print(f"{tables} tables: {moves_per_second:.0f} remote moves/s, "
+          f"p50 {p50 * 1000:.2f} ms, p99 {p99 * 1000:.2f} ms, {games} games finished, "
+          f"{received:.0f} state bytes per move")
+
+
+async def main_async(args):
+    seats = ["remote"] + [args.bots] * 3
+    if not args.ramp:
+        result = await run_load(args.tables, args.duration, args.connections, seats,
+                                args.host, args.port, args.unix)
+        report(args.tables, result)
+        return
+
+    # double the tables until the p99 latency goes over the target
+    tables = args.tables
+    sustained = 0
+    while True:
+        result = await run_load(tables, args.duration, args.connections, seats,
+                                args.host, args.port, args.unix)
+        report(tables, result)
+        if result[2] * 1000 > args.target_ms:
+            break
+        sustained = tables
+        tables *= 2
+    print(f"One server process sustains about {sustained} tables with p99 under {args.target_ms:.0f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load generator for the UNO table server")
+    parser.add_argument("--host", default=uno_server.DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=uno_server.DEFAULT_PORT)
+    parser.add_argument("--unix", default=None)
+    parser.add_argument("--tables", type=int, default=100)
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--bots", default="rule", choices=["rule", "minimax"])
+    parser.add_argument("--ramp", action="store_true", help="double the tables until p99 passes --target-ms")
+    parser.add_argument("--target-ms", type=float, default=50.0)
+    parser.add_argument("--spawn", action="store_true", help="start a server process on a Unix socket first")
+    args = parser.parse_args(argv)
+
+    process = None
+    if args.spawn:
+        args.unix = os.path.join(tempfile.mkdtemp(), "uno.sock")
+        process = subprocess.Popen([sys.executable, uno_server.__file__, "--unix", args.unix],
+                                   stdout=subprocess.DEVNULL)
+        while not os.path.exists(args.unix):
+            time.sleep(0.05)
+    try:
+        asyncio.run(main_async(args))
+    finally:
+        if process is not None:
+            # SDL turns SIGTERM into a quit event the server never reads
+            process.kill()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,36 @@
-from interface import UnoInterface
+import argparse
+
+from interface import UnoInterface, ReplayInterface
+from replay import Replay, load_record, KEYFRAME_INTERVAL
+from profiler import Profiler, SAMPLE_INTERVAL
 
 if __name__ == "__main__":
-    interface = UnoInterface()
-    interface.run()
+    parser = argparse.ArgumentParser(description="Play UNO against the AI players")
+    parser.add_argument("--record", default=None, metavar="PATH", help="save the game for the replay viewer")
+    parser.add_argument("--replay", default=None, metavar="PATH", help="step through a recorded game instead")
+    parser.add_argument("--keyframe", type=int, default=KEYFRAME_INTERVAL,
+                        help="moves between the replay's saved game states")
+    parser.add_argument("--profile", nargs="?", const="profile", default=None, metavar="PREFIX",
+                        help="write PREFIX.folded flame graph data and PREFIX.frames.txt frame timings")
+    parser.add_argument("--sample-interval", type=float, default=SAMPLE_INTERVAL,
+                        help="seconds between profile stack samples")
+    parser.add_argument("--switch-interval", type=float, default=None, metavar="SECONDS",
+                        help="interpreter switch interval while profiling, shorter spreads the samples "
+                             "out but makes every thread switch more often")
+    args = parser.parse_args()
+    if args.replay and args.profile:
+        parser.error("--profile times live games, it can't be used with --replay")
+
+    if args.replay:
+        interface = ReplayInterface(Replay(load_record(args.replay), args.keyframe))
+    else:
+        profile = (Profiler(args.profile, UnoInterface.PROFILE_PHASES, args.sample_interval,
+                            switch_interval=args.switch_interval) if args.profile else None)
+        interface = UnoInterface(args.record, profile)
+    if interface.profile:
+        interface.profile.start()
+    try:
+        interface.run()
+    finally:
+        if interface.profile:
+            interface.profile.stop()
@@ -1,6 +1,31 @@
 from card import Deck, Card
+from faces import ACTION_MASK, NUMBER_MASK, WILD_MASK, FACE_COUNTS, FACE_COLOR
 import random
 
+# draw outcome classes searched at a chance node, the most likely ones first (None searches all)
+CHANCE_WIDTH = 4
+
+# the hand-picked heuristic constants as one vector, so tuner.py can search over them
+PARAM_NAMES = [
+    "state_card",        # MinimaxAI._evaluate_state: penalty per card in the AI's hand
+    "state_matching",    # bonus per card matching the top card
+    "state_special",     # bonus per action or wild card
+    "state_opponent",    # penalty per card an opponent with 2 or fewer cards is below 3
+    "move_action",       # MinimaxAI._evaluate_move: bonus for an action card
+    "move_wild",         # bonus for a wild card
+    "move_color",        # bonus per card of the same color in hand
+    "rule_action",       # RuleBasedAI class priorities, it plays from the highest playable class
+    "rule_number",
+    "rule_wild",
+]
+DEFAULT_PARAMS = [10, 5, 3, 15, 20, 15, 5, 3, 2, 1]
+
+
+def params_dict(params=None) -> dict:
+    """Name -> value for a parameter vector, the defaults if params is None"""
+    return dict(zip(PARAM_NAMES, DEFAULT_PARAMS if params is None else params))
+
+
 class Player:
     # each player has a name, an array of cards and a position
     def __init__(self, name: str, position: int):
@@ -24,81 +49,112 @@ class Player:
 
 class RuleBasedAI:
     """Simple rule-based AI that follows basic UNO strategy"""
+
+    def __init__(self, cache_size: int = 4096, params=None):
+        # maps the bitmask of the playable faces in hand to the faces of the class to play from
+        self.cache_size = cache_size
+        self.class_cache = {}
+
+        # by default the agent gets rid of special cards (skip, reverse, draw two) first, then plays
+        # the number cards and finally the wild cards, the sort is stable so ties keep that order
+        weights = params_dict(params)
+        classes = [(weights["rule_action"], ACTION_MASK), (weights["rule_number"], NUMBER_MASK),
+                   (weights["rule_wild"], WILD_MASK)]
+        self.class_order = tuple(mask for _, mask in sorted(classes, key=lambda c: -c[0]))
     
     def choose_move(self, player, game):
-        # the agent gets the top card and finds all playable cards in its hand
-        top_card = game.get_top_card()
-        playable_cards = []
-        
-        for i, card in enumerate(player.hand):
-            if game.is_valid_move(card):
-                playable_cards.append((i, card))
-        
-        if not playable_cards:
+        # the agent works on the compact face ids of its hand instead of the card objects
+        bits = [1 << card.face for card in player.hand]
+        hand_mask = 0
+        for bit in bits:
+            hand_mask |= bit
+
+        # the rule set says which faces are legal, so the agent plays by any house rules
+        playable = hand_mask & game.rules.legal_mask(game)
+        chosen = self.class_cache.get(playable)
+        if chosen is None:
+            chosen = self._choose_class(playable)
+            if len(self.class_cache) >= self.cache_size:
+                # drop the oldest entry to keep the cache bounded
+                del self.class_cache[next(iter(self.class_cache))]
+            self.class_cache[playable] = chosen
+
+        if not chosen:
             # if there are no playable cards, it should draw from the deck
             return None
 
-        # this agent prioritizes the cards + first gets rid of special cards (skip, reverse, draw two)  
-        # + then plays the number cards + finally the wild cards
-       
-        
-        special_cards = [(i, card) for i, card in playable_cards 
-                        if card.color != "wild" and card.value in ["skip", "reverse", "draw2"]]
-        number_cards = [(i, card) for i, card in playable_cards 
-                       if card.color != "wild" and card.value not in ["skip", "reverse", "draw2"]]
-        wild_cards = [(i, card) for i, card in playable_cards if card.value in ["wild", "wild_draw4"]]
-        
-        # chooses in order of priority
-        if special_cards:
-            choice = random.choice(special_cards)
-            return choice[0]  # return the index
-        elif number_cards:
-            choice = random.choice(number_cards)
-            return choice[0]  
-        elif wild_cards:
-            choice = random.choice(wild_cards)
-            return choice[0] 
-        
-        return None  # if nothing else works, draw a card
+        # random choice between the cards of the chosen class, in hand order
+        choices = [i for i, bit in enumerate(bits) if bit & chosen]
+        return random.choice(choices)
+
+    def _choose_class(self, playable):
+        """Bitmask of the playable faces in the highest priority class, 0 if nothing is playable"""
+        for class_mask in self.class_order:
+            if playable & class_mask:
+                return playable & class_mask
+        return 0
 
 
 class MinimaxAI:
     """Advanced AI using Minimax with Alpha-Beta Pruning"""
     
-    def __init__(self, max_depth=2):  # Reduced depth to prevent issues
+    def __init__(self, max_depth=2, belief=None, endgame=None, verbose=True, params=None,
+                 chance_width=CHANCE_WIDTH):  # Reduced depth to prevent issues
         self.max_depth = max_depth
+        self.verbose = verbose
         self.colors = ["red", "blue", "green", "yellow"]
-        self.evaluation_cache = {}  # Add caching to prevent re-computation
+        self.evaluation_cache = {}  # chance node values of the current search, see _chance_node
+        self.chance_width = chance_width
+        # optional HandBelief, when set the search runs on a sampled copy instead of the real hands
+        self.belief = belief
+        # optional EndgameTable, probed before searching small endgames
+        self.endgame = endgame
+        # heuristic weights, see PARAM_NAMES
+        self.weights = params_dict(params)
+        # the seat the states are scored for, set on every move
+        self.seat = 2
     
     def choose_move(self, player, game):
-        print(f"MinimaxAI evaluating {len(player.hand)} cards...")
+        self.log(f"MinimaxAI evaluating {len(player.hand)} cards...")
+        self.seat = game.current_player
+        self.evaluation_cache.clear()
+
+        # only search what this player could know about the hidden cards
+        search_game = self.belief.determinize() if self.belief else game
         
-        # Find all valid moves
-        valid_moves = []
-        for i, card in enumerate(player.hand):
-            if game.is_valid_move(card):
-                valid_moves.append(i)
-                print(f"  Valid move {i}: {card.color} {card.value}")
+        # Find all valid moves under the game's rules
+        valid_moves = game.legal_moves(player)
+        for i in valid_moves:
+            self.log(f"  Valid move {i}: {player.hand[i].color} {player.hand[i].value}")
         
         if not valid_moves:
-            print("  No valid moves, will draw card")
+            self.log("  No valid moves, will draw card")
             return None  # Draw a card
         
         # If only one valid move, play it immediately
         if len(valid_moves) == 1:
-            print(f"  Only one valid move: {valid_moves[0]}")
+            self.log(f"  Only one valid move: {valid_moves[0]}")
             return valid_moves[0]
+
+        # Small endgames are looked up instead of searched, the table is for the standard rules
+        if self.endgame is not None and game.rules.standard:
+            probe = self.endgame.probe_game(game, game.current_player)
+            if probe is not None:
+                hand_values, _ = probe
+                best_move = max(valid_moves, key=lambda move: hand_values[move])
+                self.log(f"  Endgame table move: {best_move} with win chance: {hand_values[best_move]:.2f}")
+                return best_move
         
         # Use actual minimax algorithm to evaluate moves
         best_score = float('-inf')
         best_move = None
         
-        print(f"  Running minimax evaluation...")
+        self.log(f"  Running minimax evaluation...")
         
         for move in valid_moves:
             # Clone the game state for this move evaluation
             try:
-                move_game = self._clone_game_state(game)
+                move_game = self._clone_game_state(search_game)
                 move_player = move_game.players[game.current_player]
                 
                 # Handle wild card color selection in cloned game
@@ -111,17 +167,17 @@ class MinimaxAI:
                 if move_game.play_card_silent(move):
                     # Calculate score with minimax
                     score = self._minimax(move_game, 0, False, float('-inf'), float('inf'))
-                    print(f"    Move {move} ({player.hand[move].color} {player.hand[move].value}) minimax score: {score}")
+                    self.log(f"    Move {move} ({player.hand[move].color} {player.hand[move].value}) minimax score: {score}")
                     
                     # Update best move if needed
                     if score > best_score:
                         best_score = score
                         best_move = move
                 else:
-                    print(f"    Move {move} failed in simulation")
+                    self.log(f"    Move {move} failed in simulation")
                     
             except Exception as e:
-                print(f"    Error evaluating move {move}: {e}")
+                self.log(f"    Error evaluating move {move}: {e}")
                 # Fall back to heuristic for this move
                 card = player.hand[move]
                 score = self._evaluate_move(card, player, game)
@@ -129,23 +185,28 @@ class MinimaxAI:
                     best_score = score
                     best_move = move
         
-        print(f"  Chosen move: {best_move} with score: {best_score}")
+        self.log(f"  Chosen move: {best_move} with score: {best_score}")
         return best_move
     
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
     def _evaluate_move(self, card, player, game):
         """Simple heuristic evaluation of a single move"""
+        weights = self.weights
         score = 0
         
         # Prefer special cards
         if card.value in ["skip", "reverse", "draw2"]:
-            score += 20
+            score += weights["move_action"]
         elif card.value in ["wild", "wild_draw4"]:
-            score += 15
+            score += weights["move_wild"]
         
         # Prefer cards that match common colors in hand
         if card.color != "wild":
             color_count = sum(1 for c in player.hand if c.color == card.color)
-            score += color_count * 5
+            score += color_count * weights["move_color"]
         
         return score
     
@@ -192,6 +253,10 @@ class MinimaxAI:
         # Copy game state
         clone.current_player = game.current_player
         clone.direction = game.direction
+        clone.rules = game.rules
+        clone.pending_draw = game.pending_draw
+        clone.listeners = []
+        clone.verbose = False
         
         return clone
     
@@ -206,15 +271,15 @@ class MinimaxAI:
         current_player = game.players[game.current_player]
         valid_moves = self._get_valid_moves(current_player, game)
         
-        # If no valid moves, simulate drawing a card
+        # If no valid moves, the player draws a card nobody knows yet
         if not valid_moves:
-            try:
+            if not game.deck.cards or game.pending_draw:
+                # nothing left to draw and the turn just passes, or a stack of draw cards to take,
+                # which comes off the deck like the other penalty draws
                 cloned_game = self._clone_game_state(game)
-                cloned_game.draw_from_deck_silent()  # Use silent version
+                cloned_game.draw_from_deck_silent()
                 return self._minimax(cloned_game, depth + 1, not maximizing_player, alpha, beta)
-            except:
-                # If something goes wrong, return current evaluation
-                return self._evaluate_state(game)
+            return self._chance_node(game, depth, maximizing_player)
         
         if maximizing_player:
             max_eval = float('-inf')
@@ -267,13 +332,87 @@ class MinimaxAI:
                     
             return min_eval
     
+    def _chance_node(self, game, depth, maximizing_player):
+        """
+        Expected score over the card the current player draws. The faces the AI can't see (not
+        in the discard pile or its own hand) are grouped into classes that play alike from here:
+        playable on the top card or not, color, and action card or not. The chance_width most
+        likely classes are searched, each with its most common face standing in for it.
+        """
+        drawer = game.current_player
+        top_card = game.get_top_card()
+        key = (depth, maximizing_player, drawer, game.direction, len(game.deck.cards), top_card.face,
+               top_card.color, tuple(tuple(sorted(card.face for card in player.hand)) for player in game.players))
+        value = self.evaluation_cache.get(key)
+        if value is not None:
+            return value
+
+        counts = list(FACE_COUNTS)
+        for card in game.discard_pile:
+            counts[card.face] -= 1
+        for card in game.players[self.seat].hand:
+            counts[card.face] -= 1
+
+        playable = game.rules.legal_mask(game)
+        classes = {}  # (playable, color, action) -> [copies, most common face, its copies]
+        for face, count in enumerate(counts):
+            if count <= 0:
+                continue
+            group = (playable >> face & 1, FACE_COLOR[face], ACTION_MASK >> face & 1)
+            entry = classes.get(group)
+            if entry is None:
+                classes[group] = [count, face, count]
+            else:
+                entry[0] += count
+                if count > entry[2]:
+                    entry[1], entry[2] = face, count
+
+        outcomes = sorted(classes.values(), key=lambda entry: -entry[0])[:self.chance_width]
+        if drawer != self.seat and depth + 1 >= self.max_depth:
+            # only the size of an opponent's hand is scored, so any card will do
+            outcomes = outcomes[:1]
+
+        total = sum(entry[0] for entry in outcomes)
+        value = 0.0
+        for copies, face, _ in outcomes:
+            cloned_game = self._clone_game_state(game)
+            self._draw_face(cloned_game, face)
+            # the window stays open, the cached value has to be exact
+            value += copies / total * self._minimax(cloned_game, depth + 1, not maximizing_player,
+                                                    float('-inf'), float('inf'))
+        self.evaluation_cache[key] = value
+        return value
+
+    def _draw_face(self, game, face):
+        """The current player draws a card with the given face and the turn passes"""
+        drawer = game.players[game.current_player]
+        cards = game.deck.cards
+        card = None
+        for i in range(len(cards) - 1, -1, -1):
+            if cards[i].face == face:
+                card = cards.pop(i)
+                break
+        else:
+            # the AI can't tell the deck from the hands it doesn't see: when every copy left is in
+            # another hand, that hand gets the top card of the deck in its place, so the game still
+            # has exactly the cards of a real one (the drawer's own hand is the last resort)
+            holders = [player for player in game.players if player is not drawer and player.position != self.seat]
+            for player in holders + [drawer]:
+                for i, held in enumerate(player.hand):
+                    if held.face == face:
+                        card = held
+                        player.hand[i] = cards.pop()
+                        break
+                if card is not None:
+                    break
+            else:
+                card = cards.pop()
+        drawer.hand.append(card)
+        game.next_turn()
+
     def _get_valid_moves(self, player, game):
         """Get indices of valid moves for a player"""
-        valid_moves = []
-        for i, card in enumerate(player.hand):
-            if game.is_valid_move(card):
-                valid_moves.append(i)
-        return valid_moves
+        return game.legal_moves(player)
     
     def _is_game_over(self, game):
         """Check if the game is over"""
@@ -285,13 +424,14 @@ class MinimaxAI:
     def _evaluate_state(self, game):
         """
         Heuristic evaluation function for the game state
-        Higher score is better for the AI player (Player 3)
+        Higher score is better for the AI player (the seat it is choosing a move for)
         """
-        ai_player_index = 2  # Player 3 (index 2) is our minimax AI
+        weights = self.weights
+        ai_player_index = self.seat
         ai_player = game.players[ai_player_index]
         
         # Base score: negative of number of cards (fewer cards is better)
-        score = -len(ai_player.hand) * 10
+        score = -len(ai_player.hand) * weights["state_card"]
         
         # Bonus for having cards that match the current top card
         top_card = game.get_top_card()
@@ -304,13 +444,13 @@ class MinimaxAI:
             if card.value in ["skip", "reverse", "draw2"] or card.color == "wild":
                 special_cards += 1
         
-        score += matching_cards * 5
-        score += special_cards * 3
+        score += matching_cards * weights["state_matching"]
+        score += special_cards * weights["state_special"]
         
         # Penalty for opponents with few cards
         for i, player in enumerate(game.players):
             if i != ai_player_index:
                 if len(player.hand) <= 2:
-                    score -= (3 - len(player.hand)) * 15  # Bigger penalty for opponents close to winning
+                    score -= (3 - len(player.hand)) * weights["state_opponent"]  # Bigger penalty for opponents close to winning
         
         return score
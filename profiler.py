@@ -0,0 +1,169 @@
+import os
+import sys
+import threading
+import time
+from math import frexp
+
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples, the overhead grows with the rate
+MAX_STACK_DEPTH = 64
+
+# histogram bucket upper bounds, 0.01 ms doubling up to about 5 s, plus one bucket for anything longer
+BUCKET_EDGES = [0.01 * 2 ** i for i in range(20)]  # milliseconds
+_FIRST_EDGE = BUCKET_EDGES[0] / 1000  # seconds
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread from a background thread and counts each distinct stack.
+    The counts are written in the collapsed format flame graph tools read: "a;b;c count".
+
+    The sampler only runs when the sampled thread hands over the interpreter, which it does every
+    switch interval (5 ms by default) or when it waits, so samples lean towards the waits. A
+    shorter switch_interval spreads them out, but it applies to every thread of the process for
+    as long as the sampler runs, so it is left alone unless asked for.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, thread_id=None, switch_interval=None):
+        self.interval = interval
+        self.switch_interval = switch_interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.counts = {}  # tuple of code objects, outermost first -> samples
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._switch_interval = None
+
+    def start(self):
+        if self.switch_interval is not None:
+            self._switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(self.switch_interval)
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._switch_interval is not None:
+            sys.setswitchinterval(self._switch_interval)
+            self._switch_interval = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            # code objects are cheap to hash, the names are only built when writing
+            key = tuple(reversed(stack))
+            self.counts[key] = self.counts.get(key, 0) + 1
+            self.samples += 1
+
+    def write(self, path: str):
+        lines = {}
+        for stack, count in self.counts.items():
+            line = ";".join(f"{os.path.basename(code.co_filename)}:{code.co_name}" for code in stack)
+            lines[line] = lines.get(line, 0) + count
+        with open(path, "w") as f:
+            for line, count in sorted(lines.items()):
+                f.write(f"{line} {count}\n")
+
+
+class FrameHistogram:
+    """Time per phase of every frame, kept as fixed histograms so a long run uses no more memory"""
+
+    def __init__(self, phases):
+        self.phases = list(phases)
+        self.names = self.phases + ["frame"]
+        self.counts = [[0] * (len(BUCKET_EDGES) + 1) for _ in self.names]
+        self.totals = [0.0] * len(self.names)
+        self.maxima = [0.0] * len(self.names)
+        self.frames = 0
+        self.current = dict.fromkeys(self.phases, 0.0)
+        self.last = time.perf_counter()
+
+    def lap(self, phase: str):
+        """Charge the time since the previous lap to the phase"""
+        now = time.perf_counter()
+        self.current[phase] += now - self.last
+        self.last = now
+
+    def end_frame(self):
+        # this runs every frame, so it sticks to list indexing and one frexp per phase
+        current = self.current
+        times = [current[phase] for phase in self.phases]
+        times.append(sum(times))
+        for i, seconds in enumerate(times):
+            # the edges double, so the bucket is the binary exponent of the time over the first edge
+            bucket = frexp(seconds / _FIRST_EDGE)[1] if seconds > _FIRST_EDGE else 0
+            self.counts[i][bucket if bucket < len(BUCKET_EDGES) else len(BUCKET_EDGES)] += 1
+            self.totals[i] += seconds
+            if seconds > self.maxima[i]:
+                self.maxima[i] = seconds
+        for phase in self.phases:
+            current[phase] = 0.0
+        self.frames += 1
+
+    def percentile(self, phase: str, fraction: float) -> float:
+        """Upper bound in ms of the bucket holding the given fraction of the frames"""
+        i = self.names.index(phase)
+        target = fraction * self.frames
+        seen = 0
+        for bucket, count in enumerate(self.counts[i]):
+            seen += count
+            if count and seen >= target:
+                return min(BUCKET_EDGES[bucket] if bucket < len(BUCKET_EDGES) else float("inf"), self.maxima[i] * 1000)
+        return 0.0
+
+    def report(self, unit: str = "frame") -> str:
+        lines = [f"{self.frames} {unit}s",
+                 f"{'phase':<8}{'mean ms':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}"]
+        for i, phase in enumerate(self.names):
+            mean = self.totals[i] / max(self.frames, 1) * 1000
+            lines.append(f"{phase:<8}{mean:>10.2f}{self.percentile(phase, 0.5):>10.2f}"
+                         f"{self.percentile(phase, 0.95):>10.2f}{self.percentile(phase, 0.99):>10.2f}"
+                         f"{self.maxima[i] * 1000:>10.2f}")
+
+        lines.append("")
+        lines.append(f"{unit}s per bucket (upper bound in ms)")
+        lines.append(f"{'< ms':>10}" + "".join(f"{phase:>10}" for phase in self.names))
+        for bucket in range(len(BUCKET_EDGES) + 1):
+            row = [counts[bucket] for counts in self.counts]
+            if any(row):
+                edge = f"{BUCKET_EDGES[bucket]:g}" if bucket < len(BUCKET_EDGES) else "more"
+                lines.append(f"{edge:>10}" + "".join(f"{count:>10}" for count in row))
+        return "\n".join(lines)
+
+
+class Profiler:
+    """
+    The --profile mode: samples the stack of the thread that created it and times the phases of
+    every frame. stop() writes PREFIX.folded (flame graph input) and PREFIX.frames.txt.
+    """
+
+    def __init__(self, prefix: str, phases, interval: float = SAMPLE_INTERVAL, unit: str = "frame",
+                 switch_interval=None):
+        self.prefix = prefix
+        self.unit = unit
+        self.sampler = StackSampler(interval, switch_interval=switch_interval)
+        self.frames = FrameHistogram(phases)
+        self.lap = self.frames.lap
+        self.end_frame = self.frames.end_frame
+
+    def start(self):
+        self.frames.last = time.perf_counter()
+        self.sampler.start()
+
+    def stop(self):
+        self.sampler.stop()
+        self.sampler.write(f"{self.prefix}.folded")
+        report = self.frames.report(self.unit)
+        with open(f"{self.prefix}.frames.txt", "w") as f:
+            f.write(report + "\n")
+        print(report)
+        print(f"Profile: {self.sampler.samples} stack samples in {self.prefix}.folded, "
+              f"{self.unit} timings in {self.prefix}.frames.txt")
@@ -0,0 +1,200 @@
+import os
+
+if __name__ == "__main__":
+    # records are made headless, the viewer in interface.py imports this module after opening its window
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import json
+import random
+
+from card import Deck
+from constants import COLORS
+from faces import WILD_FACE
+from game import UnoGame
+from player import Player, RuleBasedAI, MinimaxAI
+from rules import get_rules
+
+KEYFRAME_INTERVAL = 16  # a copy of the game is kept every this many moves, seeking replays at most this many
+MAX_TURNS = 1000
+
+
+class GameRecorder:
+    """
+    Writes down every move of a game from its public events. A record is the seed the game was
+    dealt with, the house rules if there are any, optionally the agent class of each seat, and
+    one entry per turn: [face, color index, hand index] for a played card, with the seat added
+    for a jump-in, None for a draw.
+    """
+
+    def __init__(self, game: UnoGame, seed: int):
+        self.game = game
+        self.seed = seed
+        self.moves = []
+        self.jump_in = None  # seat of a jump-in, its play event comes next
+        game.add_listener(self.on_event)
+
+    def close(self):
+        # stop recording, the game can be reset for the next record
+        self.game.remove_listener(self.on_event)
+
+    def on_event(self, event: dict):
+        if event["type"] == "play":
+            color = COLORS.index(event["color"]) if event["color"] in COLORS else -1
+            move = [event["face"], color, event["index"]]
+            if self.jump_in is not None:
+                move.append(self.jump_in)
+                self.jump_in = None
+            self.moves.append(move)
+        elif event["type"] == "jump_in":
+            self.jump_in = event["player"]
+        elif event["type"] == "pass":
+            self.moves.append(None)
+
+    def record(self, winner=None, agents=None) -> dict:
+        record = {"seed": self.seed, "moves": self.moves, "winner": winner}
+        if not self.game.rules.standard:
+            record["rules"] = self.game.rules.options()
+        if agents is not None:
+            record["agents"] = [type(agent).__name__ for agent in agents]
+        return record
+
+    def save(self, path: str, winner=None):
+        with open(path, "w") as f:
+            json.dump(self.record(winner), f, separators=(",", ":"))
+
+
+def load_record(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def new_game(seed: int, rules=None) -> UnoGame:
+    """The game as it was dealt for the seed, without touching the global random state"""
+    state = random.getstate()
+    random.seed(seed)
+    game = UnoGame(rules)
+    random.setstate(state)
+    game.verbose = False
+    return game
+
+
+def clone_game(game: UnoGame) -> UnoGame:
+    # same copy as MinimaxAI._clone_game_state, plus the wild color shown on screen
+    clone = UnoGame.__new__(UnoGame)
+    clone.deck = Deck.__new__(Deck)
+    clone.deck.cards = [card.clone() for card in game.deck.cards]
+    clone.discard_pile = [card.clone() for card in game.discard_pile]
+    clone.players = []
+    for player in game.players:
+        new_player = Player(player.name, player.position)
+        new_player.hand = [card.clone() for card in player.hand]
+        clone.players.append(new_player)
+    clone.current_player = game.current_player
+    clone.direction = game.direction
+    clone.last_wild_color = game.last_wild_color
+    clone.rules = game.rules
+    clone.pending_draw = game.pending_draw
+    clone.listeners = []
+    clone.verbose = False
+    return clone
+
+
+def apply_move(game: UnoGame, move):
+    """Play one recorded move, raises ValueError if it doesn't fit the game"""
+    if move is None:
+        game.draw_from_deck()
+        return
+    if len(move) == 4:
+        face, color, index, seat = move
+        if not game.jump_in(seat, index):
+            raise ValueError(f"{game.players[seat].name} can't jump in with card {face} at {index}")
+        return
+    face, color, index = move
+    player = game.players[game.current_player]
+    if not 0 <= index < len(player.hand) or player.hand[index].face != face:
+        raise ValueError(f"{player.name} has no card {face} at {index}")
+    card = player.hand[index]
+    if face >= WILD_FACE:
+        # the recorded color, so the engine doesn't pick one again
+        card.color = COLORS[color]
+        game.last_wild_color = card.color
+    if not game.play_card(index):
+        raise ValueError(f"{player.name} can't play {card.color} {card.value}")
+
+
+class Replay:
+    """A recorded game that can be moved to any turn, by way of the nearest earlier keyframe"""
+
+    def __init__(self, record: dict, keyframe_interval: int = KEYFRAME_INTERVAL):
+        self.seed = record["seed"]
+        self.moves = record["moves"]
+        self.winner = record.get("winner")
+        self.keyframe_interval = keyframe_interval
+        self.rules = get_rules(**record.get("rules", {}))
+
+        # play the whole game once and keep a copy every keyframe_interval moves
+        game = new_game(self.seed, self.rules)
+        self.keyframes = [clone_game(game)]
+        for turn, move in enumerate(self.moves, 1):
+            try:
+                apply_move(game, move)
+            except ValueError as e:
+                raise ValueError(f"move {turn} of the record: {e}") from None
+            if turn % keyframe_interval == 0:
+                self.keyframes.append(clone_game(game))
+
+        self.game = clone_game(self.keyframes[0])
+        self.turn = 0
+
+    def __len__(self):
+        return len(self.moves)
+
+    def seek(self, turn: int) -> UnoGame:
+        """The game after the given number of moves, replaying at most keyframe_interval of them"""
+        turn = max(0, min(turn, len(self.moves)))
+        start = turn // self.keyframe_interval * self.keyframe_interval
+        # going forward from the current turn is no more work than from the keyframe
+        if not start <= self.turn <= turn:
+            self.game = clone_game(self.keyframes[turn // self.keyframe_interval])
+            self.turn = start
+        while self.turn < turn:
+            apply_move(self.game, self.moves[self.turn])
+            self.turn += 1
+        return self.game
+
+
+def record_game(seed: int, agents=None, max_turns: int = MAX_TURNS, rules=None) -> dict:
+    """Play a headless game dealt from the seed and return its record"""
+    import headless
+
+    if agents is None:
+        agents = [RuleBasedAI()] * 4
+    random.seed(seed)
+    game = UnoGame(rules)
+    recorder = GameRecorder(game, seed)
+    winner, _ = headless.play_game(agents, max_turns, game)
+    return recorder.record(winner, agents)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record headless games for the replay viewer (main.py --replay)")
+    parser.add_argument("output")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--minimax", type=int, default=None, metavar="SEAT",
+                        help="seat played by the minimax AI, the others are rule-based")
+    parser.add_argument("--max-turns", type=int, default=MAX_TURNS)
+    args = parser.parse_args(argv)
+
+    seed = args.seed if args.seed is not None else random.randrange(1 << 32)
+    agents = [RuleBasedAI() for _ in range(4)]
+    if args.minimax is not None:
+        agents[args.minimax] = MinimaxAI(max_depth=2, verbose=False)
+    record = record_game(seed, agents, args.max_turns)
+    with open(args.output, "w") as f:
+        json.dump(record, f, separators=(",", ":"))
+    print(f"Recorded {len(record['moves'])} moves of seed {seed} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
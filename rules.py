@@ -0,0 +1,139 @@
+from functools import lru_cache
+
+from faces import NUM_FACES, WILD_FACE, WILD_DRAW4_FACE, FACE_KEYS, playable_mask
+
+# what can go on a pending draw with draw-stacking: any draw two or a wild draw four on a
+# draw two, only another wild draw four on a wild draw four
+_DRAW2_FACES = [face for face in range(WILD_FACE) if FACE_KEYS[face][1] == "draw2"]
+_DRAW2_MASK = sum(1 << face for face in _DRAW2_FACES)
+STACK_MASKS = dict.fromkeys(_DRAW2_FACES, _DRAW2_MASK | 1 << WILD_DRAW4_FACE)
+STACK_MASKS[WILD_DRAW4_FACE] = 1 << WILD_DRAW4_FACE
+
+
+# card effects, called with the card already on the discard pile, each one passes the turn on
+
+def advance(game, card):
+    game.next_turn()
+
+
+def skip(game, card):
+    game.next_turn()
+    if game.verbose:
+        game.log(f"Skip card played! {game.players[game.current_player].name} is skipped!")
+    game.next_turn()
+
+
+def reverse(game, card):
+    game.direction *= -1
+    if game.verbose:
+        game.log("Reverse card played! Direction changed.")
+    game.next_turn()
+
+
+def draw_penalty(count: int):
+    def effect(game, card):
+        # the next player draws and misses their turn
+        game.next_turn()
+        affected_player = game.players[game.current_player]
+        game.draw_penalty(affected_player, count)
+        if game.verbose:
+            game.log(f"{affected_player.name} draws {count} cards and is skipped!")
+        game.next_turn()
+    return effect
+
+
+def stack_penalty(count: int):
+    def effect(game, card):
+        # the next player adds a draw card of their own or draws the whole stack, see draw_from_deck
+        game.pending_draw += count
+        if game.verbose:
+            game.log(f"{game.pending_draw} cards to draw are stacked up!")
+        game.next_turn()
+    return effect
+
+
+def swap_hands(game, card):
+    # 7: the player trades hands with an opponent, unless the 7 was their last card
+    seat = game.current_player
+    if game.players[seat].hand:
+        target = game.choose_swap_target(seat)
+        player, other = game.players[seat], game.players[target]
+        player.hand, other.hand = other.hand, player.hand
+        game.emit({"type": "swap", "player": seat, "target": target})
+        if game.verbose:
+            game.log(f"{player.name} swaps hands with {other.name}!")
+    game.next_turn()
+
+
+def rotate_hands(game, card):
+    # 0: every hand passes to the next player in the direction of play, unless the 0 was the last card
+    if game.players[game.current_player].hand:
+        hands = [player.hand for player in game.players]
+        for i, player in enumerate(game.players):
+            player.hand = hands[(i - game.direction) % len(hands)]
+        game.emit({"type": "rotate", "direction": game.direction})
+        if game.verbose:
+            game.log("Everybody passes their hand on!")
+    game.next_turn()
+
+
+def _standard_legal_mask(game) -> int:
+    top_card = game.discard_pile[-1]
+    return playable_mask(top_card.color, top_card.value)
+
+
+def _stacking_legal_mask(game) -> int:
+    if game.pending_draw:
+        return STACK_MASKS[game.discard_pile[-1].face]
+    return _standard_legal_mask(game)
+
+
+class RuleSet:
+    """
+    The house rules a game is played with. Everything a variant changes is decided here once:
+    the effect of every face is looked up in a table and the legal faces come from one function,
+    so a game pays nothing per move for the variants that are off.
+
+    stacking:   a draw two or wild draw four can be answered with another one, the first player
+                who can't answer draws the whole stack
+    jump_in:    a player holding a card identical to the top card can play it out of turn, play
+                goes on from them
+    seven_zero: a 7 swaps hands with the opponent who has the fewest cards, a 0 passes every
+                hand on in the direction of play
+    """
+
+    def __init__(self, stacking: bool = False, jump_in: bool = False, seven_zero: bool = False):
+        self.stacking = stacking
+        self.jump_in = jump_in
+        self.seven_zero = seven_zero
+        self.standard = not (stacking or jump_in or seven_zero)
+
+        effects = {
+            "skip": skip,
+            "reverse": reverse,
+            "draw2": stack_penalty(2) if stacking else draw_penalty(2),
+            "wild_draw4": stack_penalty(4) if stacking else draw_penalty(4),
+        }
+        if seven_zero:
+            effects["7"] = swap_hands
+            effects["0"] = rotate_hands
+        # face id -> effect(game, card)
+        self.effects = [effects.get(FACE_KEYS[face][1], advance) for face in range(NUM_FACES)]
+        # legal_mask(game): bitmask of the faces the player to move may play
+        self.legal_mask = _stacking_legal_mask if stacking else _standard_legal_mask
+
+    def options(self) -> dict:
+        """The keyword arguments that make this rule set, to store or send it"""
+        return {"stacking": self.stacking, "jump_in": self.jump_in, "seven_zero": self.seven_zero}
+
+    def __repr__(self):
+        return f"RuleSet({', '.join(f'{key}={value}' for key, value in self.options().items())})"
+
+
+@lru_cache(maxsize=None)
+def get_rules(stacking: bool = False, jump_in: bool = False, seven_zero: bool = False) -> RuleSet:
+    """The shared rule set with these variants, tables with the same rules use the same object"""
+    return RuleSet(stacking, jump_in, seven_zero)
+
+
+STANDARD_RULES = get_rules()
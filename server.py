@@ -0,0 +1,424 @@
+import os
+
+# the server never opens a real window
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import asyncio
+import itertools
+import json
+import traceback
+
+from agents import AgentService
+from constants import COLORS
+from game import UnoGame
+from rules import get_rules, STANDARD_RULES
+from views import SeatView
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+TURN_TIMEOUT = 30.0  # seconds a remote player gets before the server draws for them
+MAX_TURNS = 1000  # the deck is never reshuffled, so a game can stall
+SEAT_KINDS = ("remote", "rule", "minimax")
+MAX_FREE_GAMES = 64  # finished games kept to deal the next tables with
+
+
+def encode(message: dict) -> bytes:
+    # one compact JSON object per line
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+class Table:
+    """One UnoGame with its seats, turn timer and bot turns"""
+
+    def __init__(self, server, table_id: int, seats, rules=STANDARD_RULES):
+        self.server = server
+        self.id = table_id
+        self.kinds = list(seats)
+        self.game = server.take_game()
+        self.game.rules = rules
+        self.clients = [None] * len(self.kinds)
+        self.views = [None] * len(self.kinds)
+        self.turns = 0
+        self.timer = None
+        self.bot_task = None
+        self.thinking = False  # a bot is using the game on a worker
+        self.started = False
+        self.finished = False
+
+    def open_seats(self):
+        return [seat for seat, kind in enumerate(self.kinds) if kind == "remote" and self.clients[seat] is None]
+
+    def join(self, client, seat=None):
+        open_seats = self.open_seats()
+        if seat is None and open_seats:
+            seat = open_seats[0]
+        if seat not in open_seats:
+            raise ValueError(f"seat {seat} is not open at table {self.id}")
+        self.clients[seat] = client
+        self.views[seat] = SeatView(self.id, seat, self.game)
+        client.seats[self.id] = seat
+        if not self.started and not self.open_seats():
+            self.start()
+        elif self.started:
+            client.send(self.views[seat].snapshot(self.turns))
+        return seat
+
+    def leave(self, client):
+        for seat, seated in enumerate(self.clients):
+            if seated is client:
+                self.clients[seat] = None
+                self.views[seat] = None
+        # nobody is left to play against the bots
+        if all(seated is None for seated in self.clients):
+            self.close()
+
+    def close(self):
+        if self.server.tables.pop(self.id, None) is None:
+            return
+        self.finished = True
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        # a game a bot is still thinking about can't be dealt again yet, the bot turn releases it
+        # when the search is done
+        if self.thinking:
+            return
+        if self.bot_task is not None:
+            self.bot_task.cancel()
+            self.bot_task = None
+        self.server.release_game(self.game)
+
+    def start(self):
+        self.started = True
+        self.broadcast_state()
+        self.next_turn()
+
+    def next_turn(self):
+        """Called after every move: end the game, start a bot turn or time the remote player"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        if self.game.check_winner() is not None or self.turns >= self.server.max_turns:
+            self.finish()
+            return
+
+        seat = self.game.current_player
+        kind = self.kinds[seat]
+        if kind != "remote":
+            self.bot_task = asyncio.ensure_future(self.bot_turn(seat, kind))
+            self.bot_task.add_done_callback(self.bot_turn_done)
+        else:
+            loop = asyncio.get_running_loop()
+            self.timer = loop.call_later(self.server.turn_timeout, self.on_timeout, self.turns)
+
+    async def bot_turn(self, seat: int, kind: str):
+        if self.server.bot_delay:
+            await asyncio.sleep(self.server.bot_delay)
+            if self.finished:
+                return
+
+        # the agents are shared by every table, searches run on the service's workers and the
+        # rule-based one right here since it is cheaper than the hand-off
+        self.thinking = True
+        try:
+            move_index = await self.server.agents.choose_move(kind, self.game)
+        except Exception:
+            # nothing awaits this task, a failing agent draws for its seat like an invalid move
+            # instead of stopping the table
+            traceback.print_exc()
+            move_index = None
+        finally:
+            self.thinking = False
+        # the move below can end the game and close the table, which must not cancel this task
+        self.bot_task = None
+
+        if self.finished:
+            # the table was closed during the search and left the game to us
+            self.server.release_game(self.game)
+            return
+        if not self.apply_move(seat, move_index):
+            # in case of invalid move, draws from deck
+            self.apply_move(seat, None)
+
+    def bot_turn_done(self, task):
+        # anything else going wrong in a bot turn leaves the game in an unknown state, the table is closed
+        if not task.cancelled() and task.exception() is not None:
+            traceback.print_exception(task.exception())
+            self.broadcast({"type": "error", "message": f"table {self.id} closed after an internal error"})
+            for client in self.clients:
+                if client is not None:
+                    client.seats.pop(self.id, None)
+            self.close()
+
+    def on_timeout(self, turn: int):
+        # the remote player took too long, they draw a card and pass
+        self.timer = None
+        if not self.finished and self.turns == turn:
+            self.apply_move(self.game.current_player, None)
+
+    def find_face(self, seat: int, face: int):
+        # clients that follow the deltas don't know the hand order, they name the face instead
+        for i, card in enumerate(self.game.players[seat].hand):
+            if card.face == face:
+                return i
+        return None
+
+    def apply_move(self, seat: int, move_index, color=None) -> bool:
+        """Play the card at move_index for the seat, or draw if it is None. False if the move is invalid"""
+        game = self.game
+        if self.finished or seat != game.current_player:
+            return False
+        player = game.players[seat]
+
+        if move_index is None:
+            game.draw_from_deck()
+        else:
+            if not 0 <= move_index < len(player.hand):
+                return False
+            card = player.hand[move_index]
+            if card.value in ["wild", "wild_draw4"]:
+                # remote players pick their own color, the engine only picks for the AI seats
+                if color in COLORS:
+                    card.color = color
+                    game.last_wild_color = color
+                elif seat == 0:
+                    card.color = game.choose_wild_color(player.hand)
+                    game.last_wild_color = card.color
+            if not game.play_card(move_index):
+                return False
+
+        self.turns += 1
+        self.server.moves += 1
+        self.broadcast_state()
+        if move_index is None or not self.bot_jumps_in():
+            self.next_turn()
+        return True
+
+    def jump_in(self, seat: int, move_index) -> bool:
+        """Play a copy of the top card out of turn under the jump-in rule, False if the move is invalid"""
+        # a bot searching on a worker is reading the game
+        if self.finished or self.thinking or not self.started or move_index is None:
+            return False
+        if not self.game.jump_in(seat, move_index):
+            return False
+        self.turns += 1
+        self.server.moves += 1
+        self.broadcast_state()
+        if not self.bot_jumps_in():
+            self.next_turn()
+        return True
+
+    def bot_jumps_in(self) -> bool:
+        # after a card is played, a bot holding a copy of it jumps in at once
+        if not self.game.rules.jump_in or self.game.check_winner() is not None:
+            return False
+        for seat, index in self.game.jump_in_moves():
+            if self.kinds[seat] != "remote":
+                return self.jump_in(seat, index)
+        return False
+
+    def finish(self):
+        self.finished = True
+        winner = None
+        for seat, player in enumerate(self.game.players):
+            if len(player.hand) == 0:
+                winner = seat
+        self.broadcast({"type": "game_over", "table": self.id, "winner": winner, "turns": self.turns})
+        for client in self.clients:
+            if client is not None:
+                client.seats.pop(self.id, None)
+        self.close()
+
+    def broadcast_state(self):
+        # every seat gets only what changed for it since its last message
+        for seat, client in enumerate(self.clients):
+            if client is not None:
+                client.send(self.views[seat].update(self.turns))
+
+    def broadcast(self, message: dict):
+        for client in self.clients:
+            if client is not None:
+                client.send(message)
+
+
+class Connection:
+    """A remote client, it can sit at any number of tables"""
+
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.seats = {}  # table id -> seat
+        self.closed = False
+
+    def send(self, message: dict):
+        if self.closed:
+            return
+        if self.writer.is_closing():
+            self.close()
+            return
+        # a client that stops reading is dropped instead of buffering without bound
+        if self.writer.transport.get_write_buffer_size() > self.server.max_buffer:
+            self.close()
+            return
+        self.writer.write(encode(message))
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.writer.close()
+
+    async def serve(self):
+        try:
+            while not self.closed:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                    self.server.dispatch(self, message)
+                except (ValueError, KeyError, TypeError) as e:
+                    self.send({"type": "error", "message": str(e)})
+                await self.writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for table_id in list(self.seats):
+                table = self.server.tables.get(table_id)
+                if table is not None:
+                    table.leave(self)
+            self.close()
+
+
+class UnoServer:
+    """Hosts many UnoGame tables in one process over a line-delimited JSON protocol"""
+
+    def __init__(self, turn_timeout: float = TURN_TIMEOUT, bot_delay: float = 0.0, workers: int = 4,
+                 max_turns: int = MAX_TURNS, max_buffer: int = 1 << 20, processes: bool = False,
+                 endgame_path=None):
+        self.turn_timeout = turn_timeout
+        self.bot_delay = bot_delay
+        self.max_turns = max_turns
+        self.max_buffer = max_buffer
+        self.agents = AgentService(workers, processes, endgame_path=endgame_path)
+        self.tables = {}
+        self.free_games = []
+        self.moves = 0
+        self._table_ids = itertools.count(1)
+
+    def take_game(self) -> UnoGame:
+        # finished games are dealt again instead of building 108 new cards for every table
+        if self.free_games:
+            game = self.free_games.pop()
+            game.reset()
+            return game
+        game = UnoGame()
+        game.verbose = False
+        return game
+
+    def release_game(self, game: UnoGame):
+        if len(self.free_games) < MAX_FREE_GAMES:
+            self.free_games.append(game)
+
+    def new_table(self, seats, rules=STANDARD_RULES) -> Table:
+        if len(seats) != 4 or any(kind not in SEAT_KINDS for kind in seats):
+            raise ValueError(f"seats must be 4 of {SEAT_KINDS}")
+        table = Table(self, next(self._table_ids), seats, rules)
+        self.tables[table.id] = table
+        if not table.open_seats():
+            table.start()
+        return table
+
+    def dispatch(self, client: Connection, message: dict):
+        op = message["op"]
+        if op == "new_table":
+            # house rules as {"stacking": true, "jump_in": true, "seven_zero": true}, all off by default
+            rules = get_rules(**message.get("rules", {}))
+            table = self.new_table(message.get("seats", ["remote", "rule", "minimax", "rule"]), rules)
+            client.send({"type": "table", "table": table.id, "seats": table.kinds, "rules": rules.options()})
+            if message.get("join"):
+                seat = table.join(client)
+                client.send({"type": "joined", "table": table.id, "seat": seat})
+        elif op == "join":
+            table = self._table(message)
+            seat = table.join(client, message.get("seat"))
+            client.send({"type": "joined", "table": table.id, "seat": seat})
+        elif op in ("play", "draw"):
+            table = self._table(message)
+            seat = client.seats.get(table.id)
+            # with the jump-in rule a card can be played out of turn
+            jump_in = op == "play" and table.game.rules.jump_in and seat != table.game.current_player
+            if seat is None or (seat != table.game.current_player and not jump_in) or not table.started:
+                raise ValueError(f"it is not your turn at table {table.id}")
+            if op == "draw":
+                move_index = None
+            elif "face" in message:
+                move_index = table.find_face(seat, message["face"])
+                if move_index is None:
+                    raise ValueError(f"no card {message['face']} in your hand at table {table.id}")
+            else:
+                move_index = message["card"]
+            if jump_in:
+                if not table.jump_in(seat, move_index):
+                    raise ValueError(f"you can't jump in at table {table.id}")
+            elif not table.apply_move(seat, move_index, message.get("color")):
+                raise ValueError(f"invalid move at table {table.id}")
+        elif op == "resync":
+            # a client that missed a message gets a full snapshot
+            table = self._table(message)
+            seat = client.seats.get(table.id)
+            if seat is None:
+                raise ValueError(f"you are not seated at table {table.id}")
+            client.send(table.views[seat].snapshot(table.turns))
+        elif op == "stats":
+            client.send({"type": "stats", "tables": len(self.tables), "moves": self.moves})
+        else:
+            raise ValueError(f"unknown op {op!r}")
+
+    def _table(self, message: dict) -> Table:
+        table = self.tables.get(message["table"])
+        if table is None:
+            raise ValueError(f"no table {message['table']}")
+        return table
+
+    async def handle_connection(self, reader, writer):
+        await Connection(self, reader, writer).serve()
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_path=None):
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle_connection, unix_path)
+            print(f"Uno server listening on {unix_path}")
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+            print(f"Uno server listening on {host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host many UNO tables for remote players and bots")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", default=None, help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--turn-timeout", type=float, default=TURN_TIMEOUT)
+    parser.add_argument("--bot-delay", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=4, help="threads (or processes) for the minimax bots")
+    parser.add_argument("--processes", action="store_true",
+                        help="search in worker processes, so the minimax bots scale with the cores")
+    parser.add_argument("--endgame", default=None, metavar="PATH", help="endgame table for the minimax bots")
+    args = parser.parse_args(argv)
+
+    server = UnoServer(args.turn_timeout, args.bot_delay, args.workers, processes=args.processes,
+                       endgame_path=args.endgame)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.agents.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import headless
+from headless import memory_audit, memory_growth, MEMORY_TOLERANCE, MAX_NEW_OBJECTS
+
+
+def test_reused_games_stay_flat():
+    rows = memory_audit(600, seed=0, checkpoints=6)
+    slope, growth, objects = memory_growth(rows)
+    assert growth < MEMORY_TOLERANCE, f"{slope:.1f} bytes per game after the warm-up"
+    assert objects < MAX_NEW_OBJECTS
+
+
+def test_audit_catches_a_leak(monkeypatch):
+    leaked = []
+    play_game = headless.play_game
+
+    def leaky_play_game(*args, **kwargs):
+        leaked.append(bytearray(1024))
+        return play_game(*args, **kwargs)
+
+    monkeypatch.setattr(headless, "play_game", leaky_play_game)
+    rows = memory_audit(200, seed=0, checkpoints=4, max_warmup=0)
+    slope, growth, objects = memory_growth(rows)
+    assert slope > 1000
+    assert growth >= MEMORY_TOLERANCE or objects >= MAX_NEW_OBJECTS
@@ -0,0 +1,260 @@
+import os
+
+# headless runs never open a real window
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import headless
+from fileio import save_json
+from game import UnoGame
+from player import RuleBasedAI, MinimaxAI, PARAM_NAMES, DEFAULT_PARAMS
+
+# the parameters that change how each agent plays, the others are left at their defaults
+# (MinimaxAI only scores moves with the move_* weights when simulating one fails, so tuning them
+# would follow noise)
+TUNED_PARAMS = {
+    "rule": ["rule_action", "rule_number", "rule_wild"],
+    "minimax": ["state_card", "state_matching", "state_special", "state_opponent"],
+}
+# how far each side of an SPSA step nudges the parameters, as a fraction of their defaults: the
+# rule-based priorities only matter through the order they put the classes in, so they need
+# nudges big enough to swap classes
+PERTURBATION = {"rule": 0.5, "minimax": 0.2}
+TASKS_PER_WORKER = 4  # each side of an SPSA step is split this many times per worker to even out the load
+MAX_TURNS = 1000
+
+# SPSA gain sequences a_k = a / (k + 1 + A)^ALPHA and c_k = c / (k + 1)^GAMMA, the standard exponents,
+# a is set so the first step that sees a difference moves the parameters by the given step
+ALPHA = 0.602
+GAMMA = 0.101
+
+# one opponent per worker process, so its class cache stays warm from one batch to the next
+_opponent = None
+
+
+def make_agent(agent: str, params):
+    if agent == "rule":
+        return RuleBasedAI(params=params)
+    return MinimaxAI(max_depth=2, verbose=False, params=params)
+
+
+def play_batch(agent: str, params, seeds, max_turns: int = MAX_TURNS) -> int:
+    """
+    Games won by the agent with the given parameters, one game per seed. The agent takes seat
+    seed % 4 against default rule-based AIs, so consecutive seeds rotate it around the table.
+    """
+    global _opponent
+    if _opponent is None:
+        _opponent = RuleBasedAI()
+    tuned = make_agent(agent, params)
+
+    wins = 0
+    game = None
+    for seed in seeds:
+        # the deal and every random choice come from the seed, so both sides of an SPSA step
+        # play the same games and only the parameters differ
+        random.seed(seed)
+        if game is None:
+            game = UnoGame()
+            game.verbose = False
+        else:
+            game.reset()
+        seat = seed % 4
+        agents = [_opponent] * 4
+        agents[seat] = tuned
+        winner, _ = headless.play_game(agents, max_turns, game)
+        wins += winner == seat
+    return wins
+
+
+def split(seeds, parts: int):
+    size = -(-len(seeds) // parts)
+    return [seeds[i:i + size] for i in range(0, len(seeds), size)]
+
+
+class Tuner:
+    """
+    SPSA over the parameters of one agent. Every step plays the same batch of seeded games with
+    the parameters nudged both ways along a random ±1 direction and moves along the difference in
+    wins, so a step costs two batches whatever the number of parameters. Every eval_every steps
+    the current parameters play a fixed validation set, the best of those is the result.
+
+    The parameters are searched as multiples of their defaults, so one step size fits weights of
+    any magnitude, and kept non-negative since the heuristics already give each weight its sign.
+    """
+
+    def __init__(self, agent: str = "rule", batch: int = 400, eval_games: int = 2000, eval_every: int = 5,
+                 seed: int = 0, step: float = 0.2, perturbation=None, workers=None,
+                 max_turns: int = MAX_TURNS):
+        self.agent = agent
+        self.names = TUNED_PARAMS[agent]
+        self.scales = [max(abs(DEFAULT_PARAMS[PARAM_NAMES.index(name)]), 1) for name in self.names]
+        # a multiple of 4 so every seat gets the same share of each batch
+        self.batch = -(-batch // 4) * 4
+        self.eval_games = -(-eval_games // 4) * 4
+        self.eval_every = eval_every
+        self.seed = seed
+        self.step = step
+        self.perturbation = perturbation if perturbation is not None else PERTURBATION[agent]
+        self.workers = workers or os.cpu_count() or 1
+        self.max_turns = max_turns
+
+        self.state = {
+            "agent": agent, "batch": self.batch, "seed": seed,
+            "iteration": 0, "games": 0, "gain": None,
+            "x": [1.0] * len(self.names),
+            "best": None,  # {"params": full vector, "win_rate": validation win rate, "iteration": k}
+            "baseline": None,
+            "history": [],
+        }
+
+    def params(self, x) -> list:
+        """Full parameter vector for a point of the search space"""
+        params = list(DEFAULT_PARAMS)
+        for name, value, scale in zip(self.names, x, self.scales):
+            params[PARAM_NAMES.index(name)] = value * scale
+        return params
+
+    def _win_rates(self, pool, jobs):
+        """Win rate for each (params, seeds) job, all of them spread over the pool at once"""
+        parts = max(self.workers * TASKS_PER_WORKER // len(jobs), 1)
+        futures = [[pool.submit(play_batch, self.agent, params, chunk, self.max_turns)
+                    for chunk in split(seeds, parts)] for params, seeds in jobs]
+        return [sum(future.result() for future in chunk_futures) / len(seeds)
+                for chunk_futures, (_, seeds) in zip(futures, jobs)]
+
+    def _validation_seeds(self):
+        return list(range(self.seed, self.seed + self.eval_games))
+
+    def _batch_seeds(self, k: int):
+        # after the validation seeds, so no training game is ever a validation game
+        start = self.seed + self.eval_games + k * self.batch
+        return list(range(start, start + self.batch))
+
+    def _validate(self, pool, x):
+        params = self.params(x)
+        (win_rate,) = self._win_rates(pool, [(params, self._validation_seeds())])
+        self.state["games"] += self.eval_games
+        return params, win_rate
+
+    def run(self, budget: int, checkpoint=None, time_limit=None, log=print) -> dict:
+        """Tune until the next step would go over budget games (or time_limit seconds), returns the best"""
+        state = self.state
+        start = time.perf_counter()
+        # A in the step sequence is a tenth of the steps the whole budget allows
+        stability = 0.1 * max(budget // (2 * self.batch), 1)
+        with ProcessPoolExecutor(self.workers) as pool:
+            if state["best"] is None:
+                params, win_rate = self._validate(pool, state["x"])
+                state["baseline"] = win_rate
+                state["best"] = {"params": params, "win_rate": win_rate, "iteration": 0}
+                log(f"defaults: win rate {win_rate:.4f} over {self.eval_games} games")
+
+            while state["games"] + 2 * self.batch <= budget:
+                if time_limit is not None and time.perf_counter() - start >= time_limit:
+                    break
+                k = state["iteration"]
+                c_k = self.perturbation / (k + 1) ** GAMMA
+                # the direction comes from the seed and step, so a resumed run takes the same steps
+                rng = random.Random(self.seed * 1_000_003 + k)
+                delta = [rng.choice((-1, 1)) for _ in self.names]
+
+                x = state["x"]
+                plus = [max(v + c_k * d, 0.0) for v, d in zip(x, delta)]
+                minus = [max(v - c_k * d, 0.0) for v, d in zip(x, delta)]
+                seeds = self._batch_seeds(k)
+                y_plus, y_minus = self._win_rates(pool, [(self.params(plus), seeds), (self.params(minus), seeds)])
+                state["games"] += 2 * self.batch
+
+                # we maximize the win rate, and 1/delta is delta for ±1
+                gradient = (y_plus - y_minus) / (2 * c_k)
+                if state["gain"] is None and gradient:
+                    state["gain"] = self.step * (k + 1 + stability) ** ALPHA / abs(gradient)
+                a_k = (state["gain"] or 0.0) / (k + 1 + stability) ** ALPHA
+                state["x"] = [max(v + a_k * gradient * d, 0.0) for v, d in zip(x, delta)]
+                state["iteration"] = k + 1
+                state["history"].append([k, y_plus, y_minus])
+
+                if state["iteration"] % self.eval_every == 0 and state["games"] + self.eval_games <= budget:
+                    params, win_rate = self._validate(pool, state["x"])
+                    if win_rate > state["best"]["win_rate"]:
+                        state["best"] = {"params": params, "win_rate": win_rate, "iteration": state["iteration"]}
+                    elapsed = time.perf_counter() - start
+                    log(f"step {state['iteration']}: win rate {win_rate:.4f} (best {state['best']['win_rate']:.4f}), "
+                        f"{state['games']} games, {elapsed:.0f} s")
+
+                if checkpoint:
+                    save_json(checkpoint, state)
+        if checkpoint:
+            save_json(checkpoint, state)
+        return state["best"]
+
+    def resume(self, path: str):
+        with open(path) as f:
+            state = json.load(f)
+        for key in ("agent", "batch", "seed"):
+            if state[key] != self.state[key]:
+                raise SystemExit(f"{path} was made with {key} {state[key]}, not {self.state[key]}")
+        self.state = state
+
+
+def load_params(path: str) -> list:
+    """The parameter vector from a tuner output file, for RuleBasedAI(params=...) or MinimaxAI(params=...)"""
+    with open(path) as f:
+        data = json.load(f)
+    return [data["params"][name] for name in PARAM_NAMES]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune the AI heuristics by self-play with SPSA")
+    parser.add_argument("--agent", choices=sorted(TUNED_PARAMS), default="rule")
+    parser.add_argument("--budget", type=int, default=200_000, help="games to play in total")
+    parser.add_argument("--time-limit", type=float, default=None, metavar="SECONDS")
+    parser.add_argument("--batch", type=int, default=400, help="games per side of each SPSA step")
+    parser.add_argument("--eval-games", type=int, default=2000)
+    parser.add_argument("--eval-every", type=int, default=5, metavar="STEPS")
+    parser.add_argument("--step", type=float, default=0.2,
+                        help="size of the first step, as a fraction of the defaults")
+    parser.add_argument("--perturbation", type=float, default=None,
+                        help=f"SPSA nudge as a fraction of the defaults (default {PERTURBATION})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-turns", type=int, default=MAX_TURNS)
+    parser.add_argument("--checkpoint", default="tuner_checkpoint.json")
+    parser.add_argument("--resume", action="store_true", help="continue from --checkpoint")
+    parser.add_argument("--output", default="tuned_params.json")
+    args = parser.parse_args(argv)
+
+    tuner = Tuner(args.agent, args.batch, args.eval_games, args.eval_every, args.seed,
+                  args.step, args.perturbation, args.workers, args.max_turns)
+    if args.resume:
+        tuner.resume(args.checkpoint)
+    print(f"Tuning {', '.join(tuner.names)} on {tuner.workers} workers, {args.budget} games")
+
+    start = time.perf_counter()
+    games = tuner.state["games"]
+    best = tuner.run(args.budget, args.checkpoint, args.time_limit)
+    seconds = time.perf_counter() - start
+
+    save_json(args.output, {
+        "agent": args.agent,
+        "params": dict(zip(PARAM_NAMES, best["params"])),
+        "win_rate": best["win_rate"],
+        "baseline": tuner.state["baseline"],
+        "iteration": best["iteration"],
+        "games": tuner.state["games"],
+    })
+    print(f"{(tuner.state['games'] - games) / seconds:.0f} games/s")
+    print(f"Best win rate {best['win_rate']:.4f} (defaults {tuner.state['baseline']:.4f}) at step {best['iteration']}")
+    for name in tuner.names:
+        print(f"  {name}: {best['params'][PARAM_NAMES.index(name)]:.3f}")
+    print(f"Written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+from constants import COLORS
+from faces import NUM_FACES, FACE_KEYS
+
+# what each seat at a table gets after every move, as compact JSON with short keys
+#
+# full snapshot: {"t": "f", "tb": table, "q": seq, "st": seat, "n": turn, "h": [faces in hand],
+#                 "c": [hand count per seat], "tp": [top face, color index], "cu": current seat,
+#                 "d": direction, "k": cards left in deck, "pd": cards stacked up to draw}
+# delta:         {"t": "d", "tb": table, "q": seq, "n": turn} plus only what changed since the
+#                last message: "+" / "-" faces added to / removed from the hand, "c" as
+#                [[seat, count], ...], and "tp", "cu", "d", "k", "pd" as in the snapshot
+#
+# faces are the ids from faces.py, colors are indexes into COLORS (-1 for an unchosen wild),
+# a client that sees a gap in "q" asks for a snapshot with the "resync" op
+
+# every this many messages a seat gets a full snapshot instead of a delta
+SNAPSHOT_INTERVAL = 64
+
+
+def color_index(color: str) -> int:
+    return COLORS.index(color) if color in COLORS else -1
+
+
+class SeatView:
+    """Builds the messages for one seat, remembering what the seat was last sent"""
+
+    def __init__(self, table_id: int, seat: int, game, snapshot_interval: int = SNAPSHOT_INTERVAL):
+        self.table_id = table_id
+        self.seat = seat
+        self.game = game
+        self.snapshot_interval = snapshot_interval
+        self.seq = 0
+        self.sent = None  # the fields of the last message
+
+    def _fields(self):
+        game = self.game
+        hand = [0] * NUM_FACES
+        for card in game.players[self.seat].hand:
+            hand[card.face] += 1
+        top_card = game.get_top_card()
+        return {
+            "h": hand,
+            "c": [len(player.hand) for player in game.players],
+            "tp": [top_card.face, color_index(top_card.color)],
+            "cu": game.current_player,
+            "d": game.direction,
+            "k": len(game.deck.cards),
+            "pd": game.pending_draw,
+        }
+
+    def snapshot(self, turn: int) -> dict:
+        fields = self._fields()
+        self.seq += 1
+        self.sent = fields
+        message = {"t": "f", "tb": self.table_id, "q": self.seq, "st": self.seat, "n": turn}
+        message.update(fields)
+        message["h"] = [face for face, count in enumerate(fields["h"]) for _ in range(count)]
+        return message
+
+    def update(self, turn: int) -> dict:
+        """Message for the seat after a move: a delta, or a snapshot every snapshot_interval messages"""
+        if self.sent is None or self.seq % self.snapshot_interval == 0:
+            return self.snapshot(turn)
+
+        fields = self._fields()
+        sent = self.sent
+        self.seq += 1
+        self.sent = fields
+        message = {"t": "d", "tb": self.table_id, "q": self.seq, "n": turn}
+
+        added = []
+        removed = []
+        for face, (old, new) in enumerate(zip(sent["h"], fields["h"])):
+            if new > old:
+                added.extend([face] * (new - old))
+            elif new < old:
+                removed.extend([face] * (old - new))
+        if added:
+            message["+"] = added
+        if removed:
+            message["-"] = removed
+
+        counts = [[seat, new] for seat, (old, new) in enumerate(zip(sent["c"], fields["c"])) if new != old]
+        if counts:
+            message["c"] = counts
+        for key in ("tp", "cu", "d", "k", "pd"):
+            if fields[key] != sent[key]:
+                message[key] = fields[key]
+        return message
+
+
+class ViewState:
+    """Client side: the seat's view rebuilt from the snapshots and deltas"""
+
+    def __init__(self):
+        self.seq = None
+        self.seat = None
+        self.turn = 0
+        self.hand = [0] * NUM_FACES
+        self.counts = []
+        self.top = None
+        self.current = None
+        self.direction = 1
+        self.deck = 0
+        self.pending_draw = 0
+
+    def apply(self, message: dict) -> bool:
+        """Apply a message, returns False if one was missed and a resync is needed"""
+        if message["t"] == "f":
+            self.seat = message["st"]
+            self.hand = [0] * NUM_FACES
+            for face in message["h"]:
+                self.hand[face] += 1
+            self.counts = list(message["c"])
+        else:
+            if self.seq is None or message["q"] != self.seq + 1:
+                return False
+            for face in message.get("+", ()):
+                self.hand[face] += 1
+            for face in message.get("-", ()):
+                self.hand[face] -= 1
+            for seat, count in message.get("c", ()):
+                self.counts[seat] = count
+
+        self.seq = message["q"]
+        self.turn = message["n"]
+        self.top = message.get("tp", self.top)
+        self.current = message.get("cu", self.current)
+        self.direction = message.get("d", self.direction)
+        self.deck = message.get("k", self.deck)
+        self.pending_draw = message.get("pd", self.pending_draw)
+        return True
+
+    def top_card(self):
+        """(color, value) of the top card, with the chosen color for a wild"""
+        face, color = self.top
+        value = FACE_KEYS[face][1]
+        return (COLORS[color] if color >= 0 else "wild"), value